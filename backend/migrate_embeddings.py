@@ -0,0 +1,27 @@
+"""Convert student facial embeddings stored as float arrays to packed binary.
+
+Usage: python migrate_embeddings.py [int8|float16]
+"""
+import os
+import sys
+import asyncio
+
+import server
+
+async def main(storage_format: str) -> int:
+    server.client = server.create_mongo_client()
+    server.db = server.client[os.environ['DB_NAME']]
+    try:
+        migrated = await server.migrate_facial_embeddings(storage_format)
+    finally:
+        server.client.close()
+    
+    print(f"Migrated {migrated} student embeddings to {storage_format}")
+    return 0
+
+if __name__ == "__main__":
+    storage_format = sys.argv[1] if len(sys.argv) > 1 else server.EMBEDDING_STORAGE_FORMAT
+    if storage_format not in server.EMBEDDING_STORAGE_FORMATS:
+        print(f"Storage format must be one of {', '.join(server.EMBEDDING_STORAGE_FORMATS)}")
+        sys.exit(1)
+    sys.exit(asyncio.run(main(storage_format)))
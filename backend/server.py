@@ -1,48 +1,538 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Request, Response, UploadFile, File, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, EmailStr
+import time
+from contextlib import asynccontextmanager, contextmanager
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone, timedelta
-# from emergentintegrations.llm.chat import LlmChat, UserMessage
-try:
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    EMERGENT_AVAILABLE = True
-except ImportError:
+
+# Startup timing report (milliseconds), exposed at /api/health/startup
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+@contextmanager
+def startup_timer(name: str):
+    """Record how long an import or init step takes in the startup report"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[name] = (time.perf_counter() - started) * 1000
+
+# Import groups are timed separately; pydantic goes before fastapi, which
+# would otherwise absorb its cost
+with startup_timer("stdlib_import"):
+    from datetime import datetime, timezone, timedelta
+    from contextvars import ContextVar
+    from collections import deque
+    from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+    from pathlib import Path
+    import importlib.util
+    import os
+    import math
+    import multiprocessing
+    import struct
+    import asyncio
+    import threading
+    import logging
+    import uuid
+    import json
+    import hashlib
+    import gzip
+    import base64
+    import io
+    import csv
+
+with startup_timer("pydantic_import"):
+    from pydantic import BaseModel, Field, EmailStr
+
+with startup_timer("fastapi_import"):
+    from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Request, Response, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+    from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+    from fastapi.middleware.cors import CORSMiddleware
+    from starlette.datastructures import Headers, MutableHeaders
+
+with startup_timer("mongo_driver_import"):
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+    from pymongo import ReturnDocument, UpdateOne
+    from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+    from bson import Binary, ObjectId
+
+with startup_timer("support_libs_import"):
+    import bcrypt
+    import orjson
+    from cachetools import TTLCache
+    from dotenv import load_dotenv
+    try:
+        import brotli
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+        brotli = None
+
+# The LLM client is imported lazily by load_llm_client(); only check it exists here
+EMERGENT_AVAILABLE = importlib.util.find_spec("emergentintegrations") is not None
+if not EMERGENT_AVAILABLE:
     print("Warning: emergentintegrations not available. AI insights will be disabled.")
-    EMERGENT_AVAILABLE = False
-    LlmChat = None
-    UserMessage = None
-import os
-import logging
-import uuid
-import bcrypt
-import json
-import base64
-import cv2
-import numpy as np
-from PIL import Image
-import io
-from dotenv import load_dotenv
-from pathlib import Path
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened by the lifespan handler
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = os.environ.get('MONGO_MAX_IDLE_TIME_MS')
+MONGO_WAIT_QUEUE_TIMEOUT_MS = os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS')
+
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    """Create the Mongo client with pool sizing taken from the environment"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_TIME_MS)
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGO_WAIT_QUEUE_TIMEOUT_MS)
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], **options)
+
+# Face processing worker pool. FACE_WORKERS > 0 runs photo processing in
+# separate processes so the image stack is only ever loaded there; 0 uses
+# a thread pool inside the API worker. The processes are started from a
+# forkserver (or spawned), never forked from the API worker, whose Motor
+# threads could leave a forked child deadlocked.
+FACE_WORKERS = int(os.environ.get('FACE_WORKERS', '0'))
+FACE_WORKER_START_METHOD = os.environ.get('FACE_WORKER_START_METHOD', 'forkserver')  # forkserver or spawn
+face_executor: Optional[Executor] = None
+
+def get_face_executor() -> Executor:
+    """Get the face processing executor, creating it on first use"""
+    global face_executor
+    if face_executor is None:
+        if FACE_WORKERS > 0:
+            if FACE_WORKER_START_METHOD not in multiprocessing.get_all_start_methods():
+                raise RuntimeError(f"Unsupported FACE_WORKER_START_METHOD: {FACE_WORKER_START_METHOD}")
+            face_executor = ProcessPoolExecutor(
+                max_workers=FACE_WORKERS, mp_context=multiprocessing.get_context(FACE_WORKER_START_METHOD)
+            )
+        else:
+            face_executor = ThreadPoolExecutor(thread_name_prefix="face")
+    return face_executor
+
+async def run_face_task(func, *args):
+    """Run CPU-heavy image work off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_face_executor(), func, *args)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Mongo client on startup and release resources on shutdown"""
+    global client, db, face_executor
+    with startup_timer("mongo_client_init"):
+        client = create_mongo_client()
+        db = client[os.environ['DB_NAME']]
+        if MONGO_PROFILING:
+            db = ProfiledDatabase(db)
+    
+    with startup_timer("mongo_ping"):
+        try:
+            await client.admin.command("ping")
+        except Exception as e:
+            logger.warning(f"MongoDB ping failed during startup: {e}")
+    
+    with startup_timer("mongo_indexes"):
+        try:
+            await db.attendance_summaries.create_index("student_id", unique=True)
+            await db.cache_invalidations.create_index("created_at", expireAfterSeconds=CACHE_EVENT_TTL)
+            await db.jobs.create_index("id", unique=True)
+            await db.jobs.create_index([("status", 1), ("created_at", 1)])
+            await db.jobs.create_index([("school_id", 1), ("status", 1)])
+            await db.jobs.create_index(
+                "active_key", unique=True, partialFilterExpression={"active_key": {"$exists": True}}
+            )
+            await db.jobs.create_index("expires_at", expireAfterSeconds=0)
+            await db.jobs.create_index(
+                "serial_key", unique=True,
+                partialFilterExpression={"status": "running", "serial_key": {"$exists": True}}
+            )
+        except Exception as e:
+            logger.warning(f"Could not create indexes during startup: {e}")
+    
+    report = ", ".join(f"{name}={ms:.1f}ms" for name, ms in STARTUP_TIMINGS.items())
+    logger.info(f"Startup timings: {report}")
+    
+    kiosk_flusher = asyncio.create_task(kiosk_flush_loop())
+    invalidation_bus = asyncio.create_task(run_invalidation_bus())
+    # Each worker task gets its own id, so a lease reclaimed inside this process is still detected
+    job_workers = [asyncio.create_task(job_worker_loop(f"{WORKER_ID}:{n}")) for n in range(JOB_WORKERS)]
+    
+    yield
+    
+    for worker in job_workers:
+        worker.cancel()
+    invalidation_bus.cancel()
+    kiosk_flusher.cancel()
+    await flush_kiosk_marks()
+    client.close()
+    if face_executor is not None:
+        face_executor.shutdown(wait=False, cancel_futures=True)
+        face_executor = None
+
+# Query profiling. With MONGO_PROFILING=1 every collection call made through
+# `db` is timed and attributed to the route that issued it. Calls slower than
+# MONGO_SLOW_QUERY_MS go to the slow-query log with their explain() plan.
+MONGO_PROFILING = os.environ.get('MONGO_PROFILING', '0').lower() in ('1', 'true', 'yes')
+MONGO_SLOW_QUERY_MS = float(os.environ.get('MONGO_SLOW_QUERY_MS', '100'))
+
+# Holds the ASGI scope of the current request; the router adds the matched
+# route to it, so queries are attributed to the route template, not the raw path
+current_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_scope", default=None)
+query_stats: Dict[tuple, Dict[str, Any]] = {}
+slow_queries: deque = deque(maxlen=200)
+_explain_tasks: set = set()
+slow_query_logger = logging.getLogger("slow_query")
+
+# Operators whose list argument is a set of values rather than a sequence of clauses
+VALUE_LIST_OPERATORS = ("$in", "$nin", "$all")
+
+def query_shape(value: Any, value_list: bool = False) -> Any:
+    """Reduce a filter or pipeline to its structure, replacing values with type names"""
+    if isinstance(value, dict):
+        return {key: query_shape(item, key in VALUE_LIST_OPERATORS) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value_list:
+            # The length of an $in list doesn't change the query's shape
+            return [query_shape(value[0])] if value else []
+        # Pipeline stages and $and/$or clauses each matter
+        return [query_shape(item) for item in value]
+    return type(value).__name__
+
+def summarize_explain(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Pull the examined/returned counts and plan stages out of an explain() result"""
+    summary: Dict[str, Any] = {"stages": []}
+    
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node and isinstance(node["stage"], str):
+                summary["stages"].append(node["stage"])
+            stats = node.get("executionStats")
+            if isinstance(stats, dict) and "docs_examined" not in summary:
+                summary["docs_examined"] = stats.get("totalDocsExamined")
+                summary["keys_examined"] = stats.get("totalKeysExamined")
+                summary["n_returned"] = stats.get("nReturned")
+            for key, child in node.items():
+                if key not in ("executionStats", "allPlansExecution", "rejectedPlans"):
+                    walk(child)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child)
+    
+    walk(plan)
+    summary["collection_scan"] = "COLLSCAN" in summary["stages"]
+    return summary
+
+async def capture_explain(entry: Dict[str, Any], database, command: Dict[str, Any]) -> None:
+    """Attach an explain() plan to a slow-query log entry"""
+    try:
+        plan = await database.command({"explain": command, "verbosity": "executionStats"})
+        entry["explain"] = summarize_explain(plan)
+    except Exception as e:
+        entry["explain"] = {"error": str(e)}
+    slow_query_logger.warning(f"Slow query: {json.dumps(entry, default=str)}")
+
+def current_route() -> str:
+    """Label of the route issuing the current query, e.g. 'GET /api/students/{student_id}'"""
+    scope = current_scope.get()
+    if scope is None:
+        return "-"
+    path = getattr(scope.get("route"), "path", None) or "unmatched"
+    return f"{scope.get('method', 'WS')} {path}"
+
+def record_query(collection, operation: str, query: Any, duration_ms: float, returned: Optional[int],
+                 explain_command: Optional[Dict[str, Any]] = None) -> None:
+    """Record a profiled collection call and log it if it was slow"""
+    route = current_route()
+    shape = query_shape(query)
+    key = (route, collection.name, operation, json.dumps(shape, sort_keys=True))
+    stats = query_stats.get(key)
+    if stats is None:
+        stats = query_stats[key] = {
+            "route": route, "collection": collection.name, "operation": operation, "shape": shape,
+            "count": 0, "total_ms": 0.0, "max_ms": 0.0, "returned": 0
+        }
+    stats["count"] += 1
+    stats["total_ms"] += duration_ms
+    stats["max_ms"] = max(stats["max_ms"], duration_ms)
+    stats["returned"] += returned or 0
+    
+    if duration_ms < MONGO_SLOW_QUERY_MS:
+        return
+    
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "route": route,
+        "collection": collection.name,
+        "operation": operation,
+        "shape": shape,
+        "duration_ms": round(duration_ms, 2),
+        "returned": returned
+    }
+    slow_queries.append(entry)
+    if explain_command is None:
+        slow_query_logger.warning(f"Slow query: {json.dumps(entry, default=str)}")
+        return
+    
+    # Explain runs in the background so the slow request isn't slowed further
+    task = asyncio.create_task(capture_explain(entry, collection.database, explain_command))
+    _explain_tasks.add(task)
+    task.add_done_callback(_explain_tasks.discard)
+
+class ProfiledCursor:
+    """Motor cursor wrapper timing the fetch of results"""
+    
+    def __init__(self, cursor, collection, operation: str, query: Any, explain_command: Dict[str, Any]):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+        self._query = query
+        self._explain_command = explain_command
+    
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+        
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # Keep wrapping builder calls such as sort() and limit()
+            return self if result is self._cursor else result
+        return chained
+    
+    async def to_list(self, length: Optional[int]):
+        started = time.perf_counter()
+        results = await self._cursor.to_list(length)
+        record_query(self._collection, self._operation, self._query,
+                     (time.perf_counter() - started) * 1000, len(results), self._explain_command)
+        return results
+    
+    async def __aiter__(self):
+        started = time.perf_counter()
+        returned = 0
+        async for document in self._cursor:
+            returned += 1
+            yield document
+        record_query(self._collection, self._operation, self._query,
+                     (time.perf_counter() - started) * 1000, returned, self._explain_command)
+
+class ProfiledCollection:
+    """Motor collection wrapper recording every read and write"""
+    
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self._collection = collection
+    
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+    
+    async def _timed(self, operation: str, query: Any, call, explain_command=None, count_result=None):
+        started = time.perf_counter()
+        result = await call
+        returned = count_result(result) if count_result else None
+        record_query(self._collection, operation, query,
+                     (time.perf_counter() - started) * 1000, returned, explain_command)
+        return result
+    
+    def find(self, filter=None, *args, **kwargs):
+        filter = filter or {}
+        return ProfiledCursor(
+            self._collection.find(filter, *args, **kwargs), self._collection, "find", filter,
+            {"find": self._collection.name, "filter": filter}
+        )
+    
+    def aggregate(self, pipeline, *args, **kwargs):
+        return ProfiledCursor(
+            self._collection.aggregate(pipeline, *args, **kwargs), self._collection, "aggregate", pipeline,
+            {"aggregate": self._collection.name, "pipeline": pipeline, "cursor": {}}
+        )
+    
+    async def find_one(self, filter=None, *args, **kwargs):
+        filter = filter or {}
+        return await self._timed(
+            "find_one", filter, self._collection.find_one(filter, *args, **kwargs),
+            {"find": self._collection.name, "filter": filter, "limit": 1},
+            lambda document: int(document is not None)
+        )
+    
+    async def count_documents(self, filter, *args, **kwargs):
+        return await self._timed(
+            "count_documents", filter, self._collection.count_documents(filter, *args, **kwargs),
+            {"aggregate": self._collection.name, "pipeline": [{"$match": filter}, {"$count": "n"}], "cursor": {}}
+        )
+    
+    async def find_one_and_update(self, filter, update, *args, **kwargs):
+        return await self._timed(
+            "find_one_and_update", filter, self._collection.find_one_and_update(filter, update, *args, **kwargs),
+            {"findAndModify": self._collection.name, "query": filter, "update": update},
+            lambda document: int(document is not None)
+        )
+    
+    async def update_one(self, filter, update, *args, **kwargs):
+        return await self._timed(
+            "update_one", filter, self._collection.update_one(filter, update, *args, **kwargs),
+            {"update": self._collection.name, "updates": [{"q": filter, "u": update}]}
+        )
+    
+    async def update_many(self, filter, update, *args, **kwargs):
+        return await self._timed(
+            "update_many", filter, self._collection.update_many(filter, update, *args, **kwargs),
+            {"update": self._collection.name, "updates": [{"q": filter, "u": update, "multi": True}]}
+        )
+    
+    async def replace_one(self, filter, replacement, *args, **kwargs):
+        return await self._timed(
+            "replace_one", filter, self._collection.replace_one(filter, replacement, *args, **kwargs),
+            {"update": self._collection.name, "updates": [{"q": filter, "u": replacement}]}
+        )
+    
+    async def insert_one(self, document, *args, **kwargs):
+        return await self._timed("insert_one", {}, self._collection.insert_one(document, *args, **kwargs))
+    
+    async def insert_many(self, documents, *args, **kwargs):
+        return await self._timed("insert_many", {}, self._collection.insert_many(documents, *args, **kwargs))
+    
+    async def bulk_write(self, requests, *args, **kwargs):
+        return await self._timed(
+            "bulk_write", {"operations": len(requests)},
+            self._collection.bulk_write(requests, *args, **kwargs)
+        )
+
+class ProfiledDatabase:
+    """Motor database wrapper handing out profiled collections"""
+    
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self._database = database
+    
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        return ProfiledCollection(attr) if isinstance(attr, AsyncIOMotorCollection) else attr
+    
+    def __getitem__(self, name):
+        return ProfiledCollection(self._database[name])
+
+class QueryProfilingMiddleware:
+    """Tag profiled queries with the route that issued them"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
 
 # Create the main app
-app = FastAPI(title="Shiksha-Connect API", version="1.0.0")
+app = FastAPI(title="Shiksha-Connect API", version="1.0.0", lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer(auto_error=False)
 
+# Response compression
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def choose_content_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip().lower())
+    
+    if BROTLI_AVAILABLE and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+class CompressionMiddleware:
+    """Compress large JSON and text responses with brotli or gzip"""
+    
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = choose_content_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        body_parts = []
+        streaming = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, streaming
+            if streaming:
+                await send(message)
+                return
+            
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # Streaming responses are passed through untouched
+                streaming = True
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b"".join(body_parts), "more_body": True})
+                return
+            
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+            
+            if encoding == "br":
+                body = brotli.compress(body, quality=4)
+            else:
+                body = gzip.compress(body, compresslevel=6)
+            
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # A different content coding needs a different strong validator;
+                # If-None-Match uses weak comparison, so revalidation still matches
+                headers["ETag"] = f"W/{etag}"
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+        
+        await self.app(scope, receive, send_compressed)
+
+app.add_middleware(CompressionMiddleware)
+if MONGO_PROFILING:
+    app.add_middleware(QueryProfilingMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -140,6 +630,37 @@ class SessionResponse(BaseModel):
     picture: str
     session_token: str
 
+# Fast JSON serialization
+def orjson_default(value: Any) -> Any:
+    """Serialize values orjson does not handle natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dump_json(payload: Any) -> bytes:
+    """Serialize a payload to JSON bytes with orjson"""
+    return orjson.dumps(payload, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(Response):
+    """JSON response rendered straight from dicts, skipping model validation"""
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+# Projections for trusted DB output served without model instantiation.
+# Packed embeddings are internal to matching and never sent to clients.
+STUDENT_PROJECTION = {"_id": 0, "facial_embeddings": 0, "facial_embedding_format": 0, "facial_embedding_scale": 0}
+STUDENT_CLASS_PROJECTION = {"_id": 0, "class_name": 1, "section": 1}
+STUDENT_NAME_PROJECTION = {"_id": 0, "name": 1, "roll_number": 1}
+JOB_STATUS_PROJECTION = {
+    "_id": 0, "id": 1, "kind": 1, "status": 1, "progress": 1, "message": 1, "error": 1,
+    "created_at": 1, "started_at": 1, "finished_at": 1, "expires_at": 1
+}
+ATTENDANCE_PROJECTION = {"_id": 0}
+
 # Authentication helpers
 async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     """Get current authenticated user from session token"""
@@ -154,30 +675,505 @@ async def get_current_user(request: Request, credentials: HTTPAuthorizationCrede
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    # Find user by session token
+    user = await get_user_by_session_token(session_token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    
+    return user
+
+def require_role(*roles: str):
+    """Route dependency allowing only users with one of the given roles"""
+    async def check(current_user: User = Depends(get_current_user)) -> User:
+        if current_user.role not in roles:
+            raise HTTPException(status_code=403, detail="Not permitted")
+        return current_user
+    
+    return check
+
+async def get_user_by_session_token(session_token: str) -> Optional[User]:
+    """Find the user owning a session token"""
+    user = session_cache.get(session_token)
+    if user is not None:
+        return user
+    
     user_data = await db.users.find_one({"session_tokens": session_token})
     if not user_data:
-        raise HTTPException(status_code=401, detail="Invalid session")
+        return None
+    
+    user = User(**user_data)
+    session_cache[session_token] = user
+    return user
+
+WEBSOCKET_AUTH_TIMEOUT = float(os.environ.get('WEBSOCKET_AUTH_TIMEOUT', '10'))
+
+async def get_websocket_user(websocket: WebSocket) -> Optional[User]:
+    """Authenticate an accepted WebSocket from the session cookie or an auth first message"""
+    session_token = websocket.cookies.get("session_token")
+    if not session_token:
+        # Never read from the URL, which ends up in access logs; clients without
+        # the cookie send {"type": "auth", "token": ...} as their first message
+        try:
+            message = await asyncio.wait_for(websocket.receive_json(), WEBSOCKET_AUTH_TIMEOUT)
+        except (asyncio.TimeoutError, KeyError, ValueError, WebSocketDisconnect):
+            return None
+        if isinstance(message, dict) and message.get("type") == "auth":
+            session_token = message.get("token")
+    
+    if not isinstance(session_token, str) or not session_token:
+        return None
+    
+    return await get_user_by_session_token(session_token)
+
+# Admission control. Marking, photo processing and analytics each get their
+# own concurrency pool and wait queue, so a burst of expensive analytics calls
+# can never take capacity away from attendance marking. Every pool also
+# enforces a per-school token bucket.
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def try_acquire(self) -> float:
+        """Take a token, returning 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class AdmissionPool:
+    """Bounded concurrency pool with a bounded wait queue and per-school rate limits"""
+    
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float,
+                 rate: float, burst: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.avg_duration = 1.0
+        self.buckets = TTLCache(maxsize=10000, ttl=3600)
+    
+    def reject(self, retry_after: float, detail: str) -> HTTPException:
+        """Build a 429 response telling the client when to retry"""
+        self.rejected += 1
+        return HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+    
+    def estimated_wait(self) -> float:
+        """Estimate how long a new request would wait for a slot"""
+        return self.avg_duration * (self.waiting + 1) / self.concurrency
+    
+    def check_rate(self, school_id: str) -> None:
+        """Take a token from the school's bucket, rejecting the request if it is empty"""
+        bucket = self.buckets.get(school_id)
+        if bucket is None:
+            bucket = self.buckets[school_id] = TokenBucket(self.rate, self.burst)
+        retry_after = bucket.try_acquire()
+        if retry_after > 0:
+            raise self.reject(retry_after, f"Rate limit exceeded for {self.name} requests")
+    
+    @asynccontextmanager
+    async def admit(self, school_id: str):
+        """Hold a slot in the pool for the duration of a request"""
+        self.check_rate(school_id)
+        
+        if self.semaphore.locked() and self.waiting >= self.queue_size:
+            raise self.reject(self.estimated_wait(), f"Too many pending {self.name} requests")
+        
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self.reject(self.estimated_wait(), f"Timed out waiting for a {self.name} slot")
+        finally:
+            self.waiting -= 1
+        
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+            # Exponentially weighted average of how long a slot is held
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - started)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the current load of the pool"""
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+            "avg_duration_s": round(self.avg_duration, 3)
+        }
+
+def build_admission_pool(name: str, concurrency: int, queue_size: int, queue_timeout: float,
+                         rate: float, burst: float) -> AdmissionPool:
+    """Create an admission pool, letting ADMISSION_<NAME>_* variables override the defaults"""
+    prefix = f"ADMISSION_{name.upper()}_"
+    return AdmissionPool(
+        name,
+        concurrency=int(os.environ.get(prefix + 'CONCURRENCY', concurrency)),
+        queue_size=int(os.environ.get(prefix + 'QUEUE', queue_size)),
+        queue_timeout=float(os.environ.get(prefix + 'QUEUE_TIMEOUT', queue_timeout)),
+        rate=float(os.environ.get(prefix + 'RATE', rate)),
+        burst=float(os.environ.get(prefix + 'BURST', burst))
+    )
+
+admission_pools: Dict[str, AdmissionPool] = {
+    "marking": build_admission_pool("marking", concurrency=64, queue_size=512, queue_timeout=10, rate=20, burst=200),
+    "photo": build_admission_pool("photo", concurrency=8, queue_size=64, queue_timeout=20, rate=2, burst=30),
+    "analytics": build_admission_pool("analytics", concurrency=2, queue_size=8, queue_timeout=5, rate=0.1, burst=3),
+}
+
+def admission_control(pool_name: str):
+    """Route dependency admitting a request through the named pool"""
+    pool = admission_pools[pool_name]
+    
+    async def admit(current_user: User = Depends(get_current_user)):
+        async with pool.admit(current_user.school_id or "default_school"):
+            yield
+    
+    return admit
+
+def rate_limit(pool_name: str):
+    """Route dependency charging the named pool's per-school bucket without holding a slot"""
+    pool = admission_pools[pool_name]
+    
+    async def check(current_user: User = Depends(get_current_user)):
+        pool.check_rate(current_user.school_id or "default_school")
+    
+    return check
+
+# Response caching helpers
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '300'))
+RESPONSE_CACHE_MAXSIZE = int(os.environ.get('RESPONSE_CACHE_MAXSIZE', '2048'))
+
+# Cached bodies are keyed by route, school, query params and the current
+# version of every data scope the response depends on. Writes bump the
+# version, so stale entries are never looked up again and simply age out.
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+cache_versions: Dict[tuple, int] = {}
+
+def get_cache_version(school_id: str, scope: str) -> int:
+    """Get the current cache version of a data scope for a school"""
+    return cache_versions.get((school_id, scope), 0)
+
+def bump_cache_version(school_id: str, *scopes: str) -> None:
+    """Invalidate cached responses depending on the given scopes"""
+    for scope in scopes:
+        key = (school_id, scope)
+        cache_versions[key] = cache_versions.get(key, 0) + 1
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+async def cached_json_response(
+    request: Request,
+    school_id: str,
+    scopes: tuple,
+    params: Dict[str, Any],
+    loader
+) -> Response:
+    """Serve a JSON payload from the response cache with ETag revalidation"""
+    versions = tuple(get_cache_version(school_id, scope) for scope in scopes)
+    key = (request.url.path, school_id, versions, tuple(sorted(params.items())))
+
+    entry = response_cache.get(key)
+    if entry is None:
+        body = dump_json(await loader())
+        # The ETag is derived from the body so every worker agrees on it
+        entry = (f'"{hashlib.sha1(body).hexdigest()}"', body)
+        response_cache[key] = entry
+
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if len(body) >= COMPRESSION_MIN_SIZE and choose_content_encoding(request.headers.get("accept-encoding", "")):
+        # CompressionMiddleware will send this body compressed under a weak ETag;
+        # use that ETag here too so a 304 carries the same validator as the 200
+        headers["ETag"] = f"W/{etag}"
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        if headers["ETag"] != etag:
+            headers["Vary"] = "Accept-Encoding"
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Cache invalidation bus. Every worker keeps its own caches, so writes made
+# by any worker are announced as small events in a short-lived
+# cache_invalidations collection. Other workers pick them up from a change
+# stream on that collection when MongoDB runs as a replica set, or by polling
+# it on a standalone mongod. Watching the events rather than attendance itself
+# keeps the marking peak from costing a document lookup per write per worker.
+CACHE_INVALIDATION_MODE = os.environ.get('CACHE_INVALIDATION_MODE', 'auto')  # auto, change_stream, polling, off
+CACHE_POLL_INTERVAL = float(os.environ.get('CACHE_POLL_INTERVAL', '1'))
+CACHE_POLL_OVERLAP = float(os.environ.get('CACHE_POLL_OVERLAP', '2'))
+CACHE_EVENT_TTL = int(os.environ.get('CACHE_EVENT_TTL', '3600'))
+SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', '60'))
+
+WORKER_ID = str(uuid.uuid4())
+
+session_cache = TTLCache(maxsize=10000, ttl=SESSION_CACHE_TTL)
+invalidation_transport: Optional[str] = None
+
+def clear_local_caches() -> None:
+    """Drop everything cached in this worker"""
+    session_cache.clear()
+    response_cache.clear()
+    class_index_cache.clear()
+
+def apply_invalidation(collection: str, school_id: Optional[str] = None, user_id: Optional[str] = None) -> None:
+    """Invalidate this worker's caches affected by a write to a collection"""
+    if collection == "users":
+        if user_id is None:
+            session_cache.clear()
+            return
+        for token, user in list(session_cache.items()):
+            if user.id == user_id:
+                session_cache.pop(token, None)
+    elif collection in ("students", "attendance"):
+        if school_id is None:
+            # Without the school (e.g. a delete) fall back to dropping everything
+            response_cache.clear()
+            class_index_cache.clear()
+        else:
+            bump_cache_version(school_id, collection)
+
+async def publish_invalidation(collection: str, school_id: Optional[str] = None, user_id: Optional[str] = None) -> None:
+    """Invalidate caches locally and announce the write to the other workers"""
+    apply_invalidation(collection, school_id, user_id)
+    if CACHE_INVALIDATION_MODE == "off":
+        return
     
-    return User(**user_data)
+    try:
+        await db.cache_invalidations.insert_one({
+            "collection": collection,
+            "school_id": school_id,
+            "user_id": user_id,
+            "worker": WORKER_ID,
+            "created_at": datetime.now(timezone.utc)
+        })
+    except Exception as e:
+        logger.error(f"Failed to publish cache invalidation for {collection}: {e}")
+
+async def watch_invalidations() -> None:
+    """Apply invalidations from a change stream on cache_invalidations inserts"""
+    global invalidation_transport
+    # Inserts carry the full event, so no updateLookup is needed
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    async with db.cache_invalidations.watch(pipeline) as stream:
+        invalidation_transport = "change_stream"
+        logger.info("Cache invalidation bus listening on a change stream")
+        async for change in stream:
+            event = change["fullDocument"]
+            if event.get("worker") == WORKER_ID:
+                continue
+            apply_invalidation(event["collection"], event.get("school_id"), event.get("user_id"))
+
+async def poll_invalidations() -> None:
+    """Apply invalidations published to the cache_invalidations collection"""
+    global invalidation_transport
+    invalidation_transport = "polling"
+    logger.info("Cache invalidation bus polling cache_invalidations")
+    
+    # Windows overlap so events committed late are still seen; ids dedupe them
+    seen = TTLCache(maxsize=100000, ttl=max(60, CACHE_POLL_OVERLAP * 10))
+    since = datetime.now(timezone.utc)
+    while True:
+        await asyncio.sleep(CACHE_POLL_INTERVAL)
+        started = datetime.now(timezone.utc)
+        events = await db.cache_invalidations.find({"created_at": {"$gte": since}}).to_list(None)
+        for event in events:
+            if event["_id"] in seen or event.get("worker") == WORKER_ID:
+                continue
+            seen[event["_id"]] = True
+            apply_invalidation(event["collection"], event.get("school_id"), event.get("user_id"))
+        since = started - timedelta(seconds=CACHE_POLL_OVERLAP)
+
+async def run_invalidation_bus() -> None:
+    """Keep this worker subscribed to cache invalidations"""
+    mode = CACHE_INVALIDATION_MODE
+    if mode == "off":
+        return
+    
+    while True:
+        try:
+            if mode == "polling":
+                await poll_invalidations()
+            else:
+                await watch_invalidations()
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            # Change streams need a replica set; standalone mongod rejects them
+            if mode == "auto" and (e.code == 40573 or "replica set" in str(e)):
+                logger.warning("Change streams unavailable, polling for cache invalidations instead")
+                mode = "polling"
+            else:
+                logger.error(f"Cache invalidation bus failed: {e}")
+        except Exception as e:
+            logger.error(f"Cache invalidation bus failed: {e}")
+        
+        # Invalidations may have been missed while disconnected
+        invalidation_transport = None
+        clear_local_caches()
+        await asyncio.sleep(CACHE_POLL_INTERVAL)
+
+# Lazy loaders for the image and LLM stacks, so workers that never touch
+# a photo or ask for insights don't pay their import cost
+_numpy = None
+_image_stack = None
+_llm_client = None
+
+def load_numpy():
+    """Import NumPy on first use, without OpenCV or PIL"""
+    global _numpy
+    if _numpy is None:
+        with startup_timer("numpy_import"):
+            import numpy
+        _numpy = numpy
+    return _numpy
+
+def load_image_stack():
+    """Import OpenCV, NumPy and PIL on first use"""
+    global _image_stack
+    if _image_stack is None:
+        np = load_numpy()
+        with startup_timer("image_stack_import"):
+            import cv2
+            from PIL import Image
+        _image_stack = (cv2, np, Image)
+    return _image_stack
+
+def load_llm_client():
+    """Import the Emergent LLM client on first use"""
+    global _llm_client
+    if _llm_client is None:
+        with startup_timer("llm_client_import"):
+            from emergentintegrations.llm.chat import LlmChat, UserMessage
+        _llm_client = (LlmChat, UserMessage)
+    return _llm_client
 
 # Image processing helpers
+FACE_EMBEDDING_SHAPE = (8, 16)  # width x height of the face descriptor grid
+FACE_EMBEDDING_SIZE = FACE_EMBEDDING_SHAPE[0] * FACE_EMBEDDING_SHAPE[1]
+
+_cascade_local = threading.local()
+
+def get_face_cascade():
+    """Get this thread's Haar face detector, loading it once per thread"""
+    cascade = getattr(_cascade_local, "cascade", None)
+    if cascade is None:
+        cv2, _, _ = load_image_stack()
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _cascade_local.cascade = cascade
+    return cascade
+
+def extract_face_embedding(gray_face) -> List[float]:
+    """Compute a normalized descriptor of a grayscale face crop (placeholder for a real model)"""
+    cv2, np, _ = load_image_stack()
+    face = cv2.resize(gray_face, FACE_EMBEDDING_SHAPE, interpolation=cv2.INTER_AREA)
+    vector = face.astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+# Photo pipeline presets. "fast" decodes JPEGs at reduced scale and runs
+# detection on a small grayscale copy; "quality" detects at full output size
+# with a finer scale step and resamples with LANCZOS.
+PHOTO_PIPELINE_PRESETS: Dict[str, Dict[str, Any]] = {
+    "fast": {
+        "max_side": 512, "detect_side": 320, "scale_factor": 1.2, "min_neighbors": 5,
+        "min_face_ratio": 0.1, "resample": "BILINEAR", "jpeg_quality": 85
+    },
+    "quality": {
+        "max_side": 512, "detect_side": 512, "scale_factor": 1.1, "min_neighbors": 4,
+        "min_face_ratio": 0.05, "resample": "LANCZOS", "jpeg_quality": 90
+    },
+}
+
+def build_photo_pipeline_preset() -> Dict[str, Any]:
+    """Get the configured photo preset, letting PHOTO_* variables override it"""
+    preset = dict(PHOTO_PIPELINE_PRESETS[os.environ.get('PHOTO_PIPELINE_MODE', 'fast')])
+    for key in ("max_side", "detect_side", "jpeg_quality"):
+        value = os.environ.get(f"PHOTO_{key.upper()}")
+        if value:
+            preset[key] = int(value)
+    return preset
+
+PHOTO_PIPELINE = build_photo_pipeline_preset()
+
+def load_photo(image_data: bytes, preset: Dict[str, Any] = PHOTO_PIPELINE):
+    """Decode an upload straight to an upright RGB image no larger than max_side"""
+    _, _, Image = load_image_stack()
+    from PIL import ImageOps
+    
+    max_side = preset["max_side"]
+    image = Image.open(io.BytesIO(image_data))
+    # For JPEGs, let the decoder downscale by 1/2, 1/4 or 1/8 while decoding,
+    # so a 12 MP phone photo never exists in memory at full resolution
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), getattr(Image.Resampling, preset["resample"]))
+    return image
+
+def detect_photo_faces(image, preset: Dict[str, Any] = PHOTO_PIPELINE):
+    """Detect faces on a downscaled grayscale copy, returning the gray image and full-size boxes"""
+    cv2, np, _ = load_image_stack()
+    gray = np.asarray(image.convert("L"))
+    
+    scale = max(gray.shape) / preset["detect_side"]
+    if scale > 1:
+        small = cv2.resize(
+            gray, (round(gray.shape[1] / scale), round(gray.shape[0] / scale)), interpolation=cv2.INTER_AREA
+        )
+    else:
+        small, scale = gray, 1.0
+    
+    min_face = max(24, int(min(small.shape) * preset["min_face_ratio"]))
+    faces = get_face_cascade().detectMultiScale(
+        small, preset["scale_factor"], preset["min_neighbors"], minSize=(min_face, min_face)
+    )
+    boxes = [tuple(int(round(value * scale)) for value in face) for face in faces]
+    return gray, boxes
+
+def encode_photo(image, preset: Dict[str, Any] = PHOTO_PIPELINE) -> str:
+    """Encode the processed photo as base64 JPEG"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=preset["jpeg_quality"])
+    return base64.b64encode(buffer.getvalue()).decode()
+
 def process_student_photo(image_data: bytes) -> Dict[str, Any]:
     """Process student photo for facial recognition"""
     try:
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Resize and standardize
-        image = image.convert('RGB')
-        image = image.resize((512, 512), Image.Resampling.LANCZOS)
-        
-        # Convert to OpenCV format for face detection
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        image = load_photo(image_data)
         
         # Simple face detection (in production, use advanced ML models)
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(cv_image, 1.1, 4)
+        gray, faces = detect_photo_faces(image)
         
         if len(faces) == 0:
             return {"success": False, "error": "No face detected"}
@@ -187,32 +1183,663 @@ def process_student_photo(image_data: bytes) -> Dict[str, Any]:
         
         # Generate simple facial embeddings (placeholder - use proper ML model in production)
         x, y, w, h = faces[0]
-        face_roi = cv_image[y:y+h, x:x+w]
-        embeddings = np.random.rand(128).tolist()  # Placeholder embeddings
-        
-        # Convert back to PIL and save as base64
-        processed_image = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
-        buffer = io.BytesIO()
-        processed_image.save(buffer, format='JPEG', quality=85)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
+        embeddings = extract_face_embedding(gray[y:y+h, x:x+w])
         
         return {
             "success": True,
-            "image_base64": image_base64,
+            "image_base64": encode_photo(image),
             "embeddings": embeddings,
-            "face_coordinates": {"x": int(x), "y": int(y), "w": int(w), "h": int(h)}
+            "face_coordinates": {"x": x, "y": y, "w": w, "h": h}
         }
         
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# Attendance summary helpers. Each student has one attendance_summaries
+# document with per-month and all-time status counts, kept current with $inc
+# on every mark so profile lookups never scan attendance history. Writers
+# reserve the summary (pending += 1) before touching attendance and release it
+# in the same $inc that applies their delta; every $inc also bumps the
+# revision. A recount is only stored if nothing was pending when it started
+# and the revision is unchanged when it finishes.
+ATTENDANCE_STATUSES = ("present", "absent", "late")
+SUMMARY_REBUILD_ATTEMPTS = 5
+SUMMARY_REBUILD_RETRY_DELAY = 0.05
+# A reservation older than this is assumed to belong to a crashed writer
+SUMMARY_PENDING_TIMEOUT = int(os.environ.get('SUMMARY_PENDING_TIMEOUT', '600'))
+
+def add_summary_change(changes: Dict[tuple, Dict[str, int]], student_id: str, school_id: str,
+                       date: str, old_status: Optional[str], new_status: Optional[str]) -> None:
+    """Accumulate the counter increments for one attendance status change"""
+    if old_status == new_status:
+        return
+    
+    increments = changes.setdefault((student_id, school_id), {})
+    month = date[:7]
+    for status_name, delta in ((old_status, -1), (new_status, 1)):
+        if status_name not in ATTENDANCE_STATUSES:
+            continue
+        for field in (f"months.{month}.{status_name}", f"totals.{status_name}"):
+            increments[field] = increments.get(field, 0) + delta
+
+def add_summary_reservation(reservations: Dict[tuple, int], student_id: str, school_id: str) -> None:
+    """Count one attendance write about to be made for a student"""
+    key = (student_id, school_id)
+    reservations[key] = reservations.get(key, 0) + 1
+
+async def reserve_summaries(reservations: Dict[tuple, int]) -> None:
+    """Mark attendance writes as in flight on the students' summaries, before making them"""
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"student_id": student_id},
+            {"$inc": {"pending": count, "revision": 1}, "$set": {"school_id": school_id, "updated_at": now}},
+            upsert=True
+        )
+        for (student_id, school_id), count in reservations.items()
+    ]
+    if operations:
+        await db.attendance_summaries.bulk_write(operations, ordered=False)
+
+async def apply_summary_changes(changes: Dict[tuple, Dict[str, int]],
+                                reservations: Optional[Dict[tuple, int]] = None) -> None:
+    """Apply accumulated counter increments to the per-student summaries, releasing their reservations"""
+    for key, count in (reservations or {}).items():
+        increments = changes.setdefault(key, {})
+        increments["pending"] = increments.get("pending", 0) - count
+    
+    operations = [
+        UpdateOne(
+            {"student_id": student_id},
+            {
+                "$inc": {**increments, "revision": 1},
+                "$set": {"school_id": school_id, "updated_at": datetime.now(timezone.utc)}
+            },
+            upsert=True
+        )
+        for (student_id, school_id), increments in changes.items()
+        if increments
+    ]
+    if operations:
+        await db.attendance_summaries.bulk_write(operations, ordered=False)
+
+def summary_reserved(summary: Optional[Dict[str, Any]]) -> bool:
+    """Check whether attendance writes for a summary may still be in flight"""
+    if not summary or summary.get("pending", 0) <= 0:
+        return False
+    updated_at = summary.get("updated_at")
+    if updated_at is None:
+        return True
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - updated_at < timedelta(seconds=SUMMARY_PENDING_TIMEOUT)
+
+async def rebuild_student_summary(student_id: str, school_id: str) -> Dict[str, Any]:
+    """Recount a student's summary from their full attendance history"""
+    pipeline = [
+        {"$match": {"student_id": student_id, "status": {"$in": list(ATTENDANCE_STATUSES)}}},
+        {"$group": {
+            "_id": {"month": {"$substrCP": ["$date", 0, 7]}, "status": "$status"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    for attempt in range(SUMMARY_REBUILD_ATTEMPTS):
+        current = await db.attendance_summaries.find_one(
+            {"student_id": student_id}, {"_id": 0, "revision": 1, "pending": 1, "updated_at": 1}
+        )
+        if summary_reserved(current):
+            # A write may already be in attendance without its $inc; counting
+            # now would count it twice once that $inc lands
+            await asyncio.sleep(SUMMARY_REBUILD_RETRY_DELAY * (attempt + 1))
+            continue
+        
+        months: Dict[str, Dict[str, int]] = {}
+        totals: Dict[str, int] = {}
+        async for result in db.attendance.aggregate(pipeline):
+            month = result["_id"]["month"]
+            status_name = result["_id"]["status"]
+            months.setdefault(month, {})[status_name] = result["count"]
+            totals[status_name] = totals.get(status_name, 0) + result["count"]
+        
+        summary = {
+            "student_id": student_id,
+            "school_id": school_id,
+            "months": months,
+            "totals": totals,
+            "revision": (current or {}).get("revision") or 0,
+            "pending": 0,
+            "backfilled": True,
+            "updated_at": datetime.now(timezone.utc)
+        }
+        # Only store the recount if no reservation or $inc landed since the
+        # revision was read; otherwise count again
+        if current is None:
+            try:
+                await db.attendance_summaries.insert_one(dict(summary))
+                return summary
+            except DuplicateKeyError:
+                continue
+        
+        result = await db.attendance_summaries.replace_one(
+            {"student_id": student_id, "revision": current.get("revision")}, summary
+        )
+        if result.matched_count:
+            return summary
+    
+    # Marks kept landing during every attempt; serve the live counters and
+    # leave the summary unbackfilled so the next lookup tries again
+    return await db.attendance_summaries.find_one({"student_id": student_id}, {"_id": 0})
+
+def attendance_rate(counts: Dict[str, int]) -> float:
+    """Percentage of marked days a student attended (present or late)"""
+    total = sum(counts.get(status_name, 0) for status_name in ATTENDANCE_STATUSES)
+    attended = counts.get("present", 0) + counts.get("late", 0)
+    return (attended / max(total, 1)) * 100
+
+# Embedding storage. Embeddings are stored as packed little-endian binary:
+# int8 with a per-student scale factor (128 bytes) or float16 (256 bytes),
+# instead of a BSON array of 128 doubles (~1.5 KB). Reads decode them with
+# np.frombuffer, without building Python float lists.
+EMBEDDING_STORAGE_FORMATS = ("int8", "float16")
+EMBEDDING_STORAGE_FORMAT = os.environ.get('EMBEDDING_STORAGE_FORMAT', 'int8')
+if EMBEDDING_STORAGE_FORMAT not in EMBEDDING_STORAGE_FORMATS:
+    raise ValueError(
+        f"EMBEDDING_STORAGE_FORMAT must be one of {', '.join(EMBEDDING_STORAGE_FORMATS)}, "
+        f"got {EMBEDDING_STORAGE_FORMAT!r}"
+    )
+
+def pack_embedding(embedding: List[float], storage_format: str = EMBEDDING_STORAGE_FORMAT) -> Dict[str, Any]:
+    """Pack an embedding into the binary student document fields"""
+    # Plain struct packing, so enrolling a student doesn't load NumPy in the API worker
+    if storage_format not in EMBEDDING_STORAGE_FORMATS:
+        raise ValueError(f"Unknown embedding storage format: {storage_format}")
+    
+    if storage_format == "float16":
+        return {
+            "facial_embeddings": Binary(struct.pack(f"<{len(embedding)}e", *embedding)),
+            "facial_embedding_format": "float16",
+            "facial_embedding_scale": 1.0
+        }
+    
+    scale = max((abs(value) for value in embedding), default=0.0) / 127 or 1.0
+    quantized = [max(-127, min(127, round(value / scale))) for value in embedding]
+    return {
+        "facial_embeddings": Binary(struct.pack(f"<{len(quantized)}b", *quantized)),
+        "facial_embedding_format": "int8",
+        "facial_embedding_scale": scale
+    }
+
+def unpack_embeddings(documents: List[Dict[str, Any]]):
+    """Decode the stored embeddings of several students into one float32 matrix"""
+    np = load_numpy()
+    matrix = np.empty((len(documents), FACE_EMBEDDING_SIZE), dtype=np.float32)
+    for row, document in enumerate(documents):
+        stored = document["facial_embeddings"]
+        storage_format = document.get("facial_embedding_format")
+        if isinstance(stored, list):
+            # Legacy record not migrated yet
+            matrix[row] = stored
+        elif storage_format == "float16":
+            matrix[row] = np.frombuffer(stored, dtype="<f2")
+        else:
+            matrix[row] = np.frombuffer(stored, dtype=np.int8)
+            matrix[row] *= document.get("facial_embedding_scale", 1.0)
+    return matrix
+
+def stored_embedding_size(document: Dict[str, Any]) -> int:
+    """Number of dimensions of a stored embedding, whatever its format"""
+    stored = document["facial_embeddings"]
+    if isinstance(stored, list):
+        return len(stored)
+    return len(stored) // (2 if document.get("facial_embedding_format") == "float16" else 1)
+
+async def migrate_facial_embeddings(storage_format: str = EMBEDDING_STORAGE_FORMAT, batch_size: int = 500) -> int:
+    """Convert students whose embeddings are still stored as float arrays"""
+    migrated = 0
+    while True:
+        students = await db.students.find(
+            {"facial_embeddings": {"$type": "array"}},
+            {"_id": 0, "id": 1, "facial_embeddings": 1}
+        ).to_list(batch_size)
+        if not students:
+            return migrated
+        
+        await db.students.bulk_write([
+            UpdateOne(
+                {"id": student["id"], "facial_embeddings": {"$type": "array"}},
+                {"$set": pack_embedding(student["facial_embeddings"], storage_format)}
+            )
+            for student in students
+        ], ordered=False)
+        migrated += len(students)
+
+# Kiosk recognition helpers
+KIOSK_FRAME_INTERVAL = float(os.environ.get('KIOSK_FRAME_INTERVAL', '0.5'))
+KIOSK_DUPLICATE_DELTA = int(os.environ.get('KIOSK_DUPLICATE_DELTA', '12'))
+KIOSK_DUPLICATE_CELLS = int(os.environ.get('KIOSK_DUPLICATE_CELLS', '1'))
+KIOSK_FULL_ANALYSIS_INTERVAL = float(os.environ.get('KIOSK_FULL_ANALYSIS_INTERVAL', '5'))
+KIOSK_MATCH_THRESHOLD = float(os.environ.get('KIOSK_MATCH_THRESHOLD', '0.85'))
+KIOSK_DEBOUNCE_SECONDS = float(os.environ.get('KIOSK_DEBOUNCE_SECONDS', '60'))
+KIOSK_FLUSH_INTERVAL = float(os.environ.get('KIOSK_FLUSH_INTERVAL', '2'))
+KIOSK_MAX_FRAME_BYTES = int(os.environ.get('KIOSK_MAX_FRAME_BYTES', str(2 * 1024 * 1024)))
+KIOSK_MIN_FACE_SIZE = int(os.environ.get('KIOSK_MIN_FACE_SIZE', '48'))
+KIOSK_SIGNATURE_GRID = (16, 12)  # width x height of the near-duplicate grid
+
+def frame_signature(gray_frame) -> bytes:
+    """Reduce a grayscale frame to a coarse grid of mean brightness values"""
+    cv2, _, _ = load_image_stack()
+    return cv2.resize(gray_frame, KIOSK_SIGNATURE_GRID, interpolation=cv2.INTER_AREA).tobytes()
+
+def frames_match(signature: bytes, previous: bytes) -> bool:
+    """Check whether two frame signatures differ in at most a few grid cells"""
+    _, np, _ = load_image_stack()
+    difference = np.abs(
+        np.frombuffer(signature, dtype=np.uint8).astype(np.int16) - np.frombuffer(previous, dtype=np.uint8)
+    )
+    # Compares cells, not a thresholded hash, so a face on an already bright background still counts
+    return int((difference > KIOSK_DUPLICATE_DELTA).sum()) <= KIOSK_DUPLICATE_CELLS
+
+def analyze_kiosk_frame(frame: bytes, previous_signature: Optional[bytes]) -> Dict[str, Any]:
+    """Detect and embed faces in a kiosk frame unless it repeats the previous one"""
+    cv2, np, _ = load_image_stack()
+    buffer = np.frombuffer(frame, dtype=np.uint8)
+    
+    # A 1/8 scale decode is enough for the near-duplicate check
+    thumbnail = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if thumbnail is None:
+        return {"error": "Invalid frame"}
+    
+    signature = frame_signature(thumbnail)
+    if previous_signature is not None and frames_match(signature, previous_signature):
+        return {"signature": signature, "duplicate": True, "faces": []}
+    
+    gray = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    faces = get_face_cascade().detectMultiScale(
+        gray, 1.2, 5, minSize=(KIOSK_MIN_FACE_SIZE, KIOSK_MIN_FACE_SIZE)
+    )
+    return {
+        "signature": signature,
+        "duplicate": False,
+        "faces": [extract_face_embedding(gray[y:y+h, x:x+w]) for x, y, w, h in faces]
+    }
+
+# Per-class embedding matrices, keyed by the students cache version so new
+# enrollments are picked up without explicit invalidation
+class_index_cache = TTLCache(maxsize=256, ttl=RESPONSE_CACHE_TTL)
+
+async def get_class_embedding_index(school_id: str, class_name: str, section: str) -> Dict[str, Any]:
+    """Get the normalized embedding matrix of a class's enrolled students"""
+    key = (school_id, class_name, section, get_cache_version(school_id, "students"))
+    index = class_index_cache.get(key)
+    if index is not None:
+        return index
+    
+    np = load_numpy()
+    students = await db.students.find(
+        {
+            "school_id": school_id,
+            "class_name": class_name,
+            "section": section,
+            "facial_embeddings": {"$ne": None}
+        },
+        {"_id": 0, "id": 1, "name": 1, "facial_embeddings": 1, "facial_embedding_format": 1, "facial_embedding_scale": 1}
+    ).to_list(1000)
+    students = [s for s in students if stored_embedding_size(s) == FACE_EMBEDDING_SIZE]
+    
+    matrix = unpack_embeddings(students)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1)
+    
+    index = {
+        "student_ids": [s["id"] for s in students],
+        "names": [s["name"] for s in students],
+        "matrix": matrix
+    }
+    class_index_cache[key] = index
+    return index
+
+def match_face_embedding(index: Dict[str, Any], embedding: List[float]) -> Optional[Dict[str, Any]]:
+    """Find the enrolled student closest to an embedding, if close enough"""
+    if not index["student_ids"]:
+        return None
+    
+    np = load_numpy()
+    scores = index["matrix"] @ np.asarray(embedding, dtype=np.float32)
+    best = int(np.argmax(scores))
+    if scores[best] < KIOSK_MATCH_THRESHOLD:
+        return None
+    
+    return {
+        "student_id": index["student_ids"][best],
+        "student_name": index["names"][best],
+        "confidence": float(scores[best])
+    }
+
+# Kiosk sightings are coalesced here and written in bulk by kiosk_flush_loop
+kiosk_pending_marks: Dict[tuple, Dict[str, Any]] = {}
+
+def queue_kiosk_mark(student_id: str, school_id: str, class_name: str, section: str,
+                     marked_by: str, confidence: float) -> None:
+    """Queue a kiosk sighting to be marked present on the next flush"""
+    date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    key = (student_id, date)
+    if key in kiosk_pending_marks:
+        return
+    
+    kiosk_pending_marks[key] = AttendanceRecord(
+        student_id=student_id,
+        school_id=school_id,
+        class_name=class_name,
+        section=section,
+        date=date,
+        status="present",
+        marked_by=marked_by,
+        method="facial_recognition",
+        confidence_score=confidence
+    ).dict()
+
+async def flush_kiosk_marks() -> None:
+    """Write queued kiosk marks with a single bulk upsert"""
+    global kiosk_pending_marks
+    if not kiosk_pending_marks:
+        return
+    
+    pending, kiosk_pending_marks = kiosk_pending_marks, {}
+    records = list(pending.values())
+    reservations: Dict[tuple, int] = {}
+    for record in records:
+        add_summary_reservation(reservations, record["student_id"], record["school_id"])
+    try:
+        await reserve_summaries(reservations)
+    except Exception as e:
+        logger.error(f"Failed to flush {len(records)} kiosk marks: {e}")
+        for key, record in pending.items():
+            kiosk_pending_marks.setdefault(key, record)
+        return
+    
+    # Marks only create missing records; a teacher's manual mark always wins
+    operations = [
+        UpdateOne(
+            {"student_id": record["student_id"], "date": record["date"]},
+            {"$setOnInsert": record},
+            upsert=True
+        )
+        for record in pending.values()
+    ]
+    summary_changes: Dict[tuple, Dict[str, int]] = {}
+    keys = list(pending)
+    try:
+        result = await db.attendance.bulk_write(operations, ordered=False)
+        upserted = list(result.upserted_ids)
+    except BulkWriteError as e:
+        # Unordered writes: everything but the failed operations was applied,
+        # so only those are retried and the inserts still count
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        logger.error(f"Failed to flush {len(failed)} of {len(operations)} kiosk marks: {e}")
+        for position in failed:
+            kiosk_pending_marks.setdefault(keys[position], records[position])
+        upserted = [item["index"] for item in e.details.get("upserted", [])]
+    except Exception as e:
+        logger.error(f"Failed to flush {len(operations)} kiosk marks: {e}")
+        for key, record in pending.items():
+            kiosk_pending_marks.setdefault(key, record)
+        await apply_summary_changes(summary_changes, reservations)
+        return
+    
+    # Only operations that inserted a record change the summaries
+    for position in upserted:
+        record = records[position]
+        add_summary_change(
+            summary_changes, record["student_id"], record["school_id"],
+            record["date"], None, record["status"]
+        )
+    await apply_summary_changes(summary_changes, reservations)
+    
+    for school_id in {record["school_id"] for record in records}:
+        await publish_invalidation("attendance", school_id=school_id)
+
+async def kiosk_flush_loop() -> None:
+    """Periodically flush coalesced kiosk marks"""
+    while True:
+        await asyncio.sleep(KIOSK_FLUSH_INTERVAL)
+        await flush_kiosk_marks()
+
+# Background jobs. Long-running work is stored in the jobs collection and
+# executed by asyncio workers inside each API process, so no external broker
+# is needed. A job holds a lease, renewed by a heartbeat while it runs; if its
+# worker dies the lease expires and another worker picks it up. Identical
+# in-flight read jobs share an active_key, and finished jobs are removed by a
+# TTL index. Write jobs are never merged; they carry a serial_key instead, and
+# a partial unique index lets only one job per serial_key run at a time, so a
+# school's marking jobs apply in the order they were submitted.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '2'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '120'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', '3600'))
+JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', '1'))
+JOB_MAX_ACTIVE_PER_SCHOOL = int(os.environ.get('JOB_MAX_ACTIVE_PER_SCHOOL', '10'))
+
+job_wakeup = asyncio.Event()
+
+async def run_report_job(job: Dict[str, Any], progress) -> Any:
+    """Job handler building an attendance report"""
+    request = AttendanceReportRequest(**job["params"])
+    return await build_attendance_report(job["school_id"], request, progress)
+
+async def run_insights_job(job: Dict[str, Any], progress) -> Any:
+    """Job handler computing analytics insights"""
+    params = dict(job["params"])
+    role = params.pop("role")
+    return await build_analytics_insights(role, job["school_id"], AnalyticsRequest(**params), progress)
+
+async def run_mark_attendance_job(job: Dict[str, Any], progress) -> Any:
+    """Job handler marking attendance for a large batch of students"""
+    request = AttendanceMarkRequest(**job["params"])
+    created = await mark_students_attendance(request, job["user_id"], job["school_id"], progress)
+    return {"message": f"Attendance marked for {len(request.student_ids)} students", "records": created}
+
+JOB_HANDLERS = {
+    "attendance_report": run_report_job,
+    "analytics_insights": run_insights_job,
+    "mark_attendance": run_mark_attendance_job,
+}
+
+# Job kinds that write data: not deduplicated, and run one at a time per school
+SERIAL_JOB_KINDS = ("mark_attendance",)
+
+async def submit_job(kind: str, school_id: str, user_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Queue a job, or return the identical read job already queued or running"""
+    serial = kind in SERIAL_JOB_KINDS
+    if not serial:
+        active_key = hashlib.sha1(
+            json.dumps({"kind": kind, "school_id": school_id, "params": params}, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        existing = await db.jobs.find_one({"active_key": active_key}, JOB_STATUS_PROJECTION)
+        if existing:
+            return {**existing, "deduplicated": True}
+    
+    # Cap queued and running jobs per school, so varying the params can't flood the queue
+    active = await db.jobs.count_documents({"school_id": school_id, "status": {"$in": ["queued", "running"]}})
+    if active >= JOB_MAX_ACTIVE_PER_SCHOOL:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many background jobs queued for this school",
+            headers={"Retry-After": str(max(1, math.ceil(JOB_POLL_INTERVAL * 5)))}
+        )
+    
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "school_id": school_id,
+        "user_id": user_id,
+        "params": params,
+        "status": "queued",
+        "progress": 0.0,
+        "message": None,
+        "attempts": 0,
+        "created_at": datetime.now(timezone.utc)
+    }
+    if serial:
+        job["serial_key"] = f"{kind}:{school_id}"
+    else:
+        job["active_key"] = active_key
+    try:
+        await db.jobs.insert_one(job)
+    except DuplicateKeyError:
+        # Another request queued the same job first
+        existing = None if serial else await db.jobs.find_one({"active_key": active_key}, JOB_STATUS_PROJECTION)
+        if existing:
+            return {**existing, "deduplicated": True}
+        raise
+    
+    job_wakeup.set()
+    job.pop("_id", None)
+    return {key: job[key] for key in JOB_STATUS_PROJECTION if key in job} | {"deduplicated": False}
+
+async def claim_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    """Atomically take the oldest claimable job, or a running job whose lease expired"""
+    now = datetime.now(timezone.utc)
+    busy_keys = None
+    while True:
+        # Skip write jobs whose school already has one running under a live lease
+        running_keys = set(await db.jobs.distinct(
+            "serial_key", {"status": "running", "lease_expires_at": {"$gte": now}}
+        ))
+        if running_keys == busy_keys:
+            return None
+        busy_keys = running_keys
+        
+        query: Dict[str, Any] = {"$or": [
+            {"status": "queued"},
+            {"status": "running", "lease_expires_at": {"$lt": now}}
+        ]}
+        if busy_keys:
+            query["serial_key"] = {"$nin": list(busy_keys)}
+        try:
+            return await db.jobs.find_one_and_update(
+                query,
+                {
+                    "$set": {
+                        "status": "running",
+                        "started_at": now,
+                        "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                        "worker": worker_id
+                    },
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker started a job with the same serial_key first
+            continue
+
+def job_progress_reporter(job_id: str, worker_id: str):
+    """Build a throttled progress callback for a running job"""
+    last_update = 0.0
+    
+    async def report(progress: float, message: Optional[str] = None) -> None:
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update < JOB_PROGRESS_INTERVAL:
+            return
+        last_update = now
+        await db.jobs.update_one(
+            {"id": job_id, "worker": worker_id},
+            {"$set": {"progress": round(min(progress, 99.0), 1), "message": message}}
+        )
+    
+    return report
+
+async def renew_job_lease(job_id: str, worker_id: str) -> None:
+    """Keep extending a running job's lease, returning if another worker took it over"""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            result = await db.jobs.update_one(
+                {"id": job_id, "worker": worker_id, "status": "running"},
+                {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to renew the lease of job {job_id}: {e}")
+            continue
+        if result.matched_count == 0:
+            return
+
+async def finish_job(job_id: str, worker_id: str, fields: Dict[str, Any]) -> None:
+    """Store a job's outcome and start its result TTL"""
+    now = datetime.now(timezone.utc)
+    await db.jobs.update_one(
+        {"id": job_id, "worker": worker_id},
+        {
+            "$set": {**fields, "finished_at": now, "expires_at": now + timedelta(seconds=JOB_RESULT_TTL)},
+            "$unset": {"active_key": "", "lease_expires_at": ""}
+        }
+    )
+
+async def run_job(job: Dict[str, Any], worker_id: str) -> None:
+    """Execute a claimed job and record its result"""
+    handler = JOB_HANDLERS.get(job["kind"])
+    if handler is None or job["attempts"] > JOB_MAX_ATTEMPTS:
+        error = f"Unknown job kind: {job['kind']}" if handler is None else "Job exceeded its retry limit"
+        await finish_job(job["id"], worker_id, {"status": "failed", "error": error})
+        return
+    
+    work = asyncio.create_task(handler(job, job_progress_reporter(job["id"], worker_id)))
+    heartbeat = asyncio.create_task(renew_job_lease(job["id"], worker_id))
+    try:
+        await asyncio.wait({work, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        heartbeat.cancel()
+        if not work.done():
+            work.cancel()
+        await asyncio.gather(work, heartbeat, return_exceptions=True)
+    
+    if work.cancelled():
+        # The lease was lost; the worker now holding the job owns its outcome
+        logger.warning(f"Job {job['id']} ({job['kind']}) was taken over by another worker")
+        return
+    
+    error = work.exception()
+    if error is not None:
+        logger.error(f"Job {job['id']} ({job['kind']}) failed", exc_info=error)
+        await finish_job(job["id"], worker_id, {"status": "failed", "error": str(error)})
+        return
+    
+    await finish_job(
+        job["id"], worker_id, {"status": "completed", "progress": 100.0, "message": None, "result": work.result()}
+    )
+
+async def job_worker_loop(worker_id: str) -> None:
+    """Run queued jobs one at a time, sleeping when the queue is empty"""
+    while True:
+        try:
+            job = await claim_job(worker_id)
+        except Exception as e:
+            logger.error(f"Failed to claim a job: {e}")
+            job = None
+        
+        if job is None:
+            job_wakeup.clear()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        
+        await run_job(job, worker_id)
+
 # AI Analytics helper
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '60'))
+
 async def generate_ai_insights(data: Dict[str, Any]) -> str:
     """Generate AI-powered insights using Emergent LLM"""
     if not EMERGENT_AVAILABLE:
         return "AI insights are currently unavailable. The emergentintegrations package is not installed."
     
     try:
+        LlmChat, UserMessage = load_llm_client()
         chat = LlmChat(
             api_key=os.environ.get('EMERGENT_LLM_KEY'),
             session_id=f"analytics_{uuid.uuid4()}",
@@ -223,9 +1850,11 @@ async def generate_ai_insights(data: Dict[str, Any]) -> str:
             text=f"Analyze this school attendance data and provide insights: {json.dumps(data, default=str)}"
         )
         
-        response = await chat.send_message(user_message)
+        response = await asyncio.wait_for(chat.send_message(user_message), LLM_TIMEOUT)
         return response
         
+    except asyncio.TimeoutError:
+        return f"Unable to generate AI insights: the model did not respond within {LLM_TIMEOUT:.0f} seconds"
     except Exception as e:
         return f"Unable to generate AI insights: {str(e)}"
 
@@ -294,11 +1923,13 @@ async def logout(request: Request, current_user: User = Depends(get_current_user
             {"id": current_user.id},
             {"$pull": {"session_tokens": session_token}}
         )
+        session_cache.pop(session_token, None)
+        await publish_invalidation("users", user_id=current_user.id)
     
     return {"message": "Logged out successfully"}
 
 # Student Management Routes
-@api_router.post("/students", response_model=Student)
+@api_router.post("/students", response_model=Student, dependencies=[Depends(admission_control("photo"))])
 async def create_student(
     name: str = Form(...),
     roll_number: str = Form(...),
@@ -337,7 +1968,7 @@ async def create_student(
     # Process photo if provided
     if photo:
         photo_data = await photo.read()
-        processed = process_student_photo(photo_data)
+        processed = await run_face_task(process_student_photo, photo_data)
         
         if processed["success"]:
             student_data["photo_url"] = f"data:image/jpeg;base64,{processed['image_base64']}"
@@ -346,97 +1977,292 @@ async def create_student(
             raise HTTPException(status_code=400, detail=processed["error"])
     
     student = Student(**student_data)
-    await db.students.insert_one(student.dict())
+    document = student.dict()
+    if student.facial_embeddings:
+        document.update(pack_embedding(student.facial_embeddings))
+    await db.students.insert_one(document)
+    await publish_invalidation("students", school_id=student.school_id)
     
-    return student
+    # Embeddings are internal to matching and never sent to clients
+    return student.dict(exclude={"facial_embeddings"})
 
 @api_router.get("/students", response_model=List[Student])
 async def get_students(
+    request: Request,
     class_name: Optional[str] = None,
     section: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get all students for current user's school"""
-    query = {"school_id": current_user.school_id or "default_school"}
+    school_id = current_user.school_id or "default_school"
+    query = {"school_id": school_id}
     
     if class_name:
         query["class_name"] = class_name
     if section:
         query["section"] = section
     
-    students = await db.students.find(query).to_list(1000)
-    return [Student(**student) for student in students]
+    async def load_students():
+        return await db.students.find(query, STUDENT_PROJECTION).to_list(1000)
+    
+    return await cached_json_response(
+        request, school_id, ("students",),
+        {"class_name": class_name, "section": section},
+        load_students
+    )
 
 @api_router.get("/students/{student_id}", response_model=Student)
-async def get_student(student_id: str, current_user: User = Depends(get_current_user)):
+async def get_student(student_id: str, request: Request, current_user: User = Depends(get_current_user)):
     """Get specific student"""
-    student = await db.students.find_one({"id": student_id})
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    async def load_student():
+        student = await db.students.find_one({"id": student_id}, STUDENT_PROJECTION)
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        return student
+    
+    return await cached_json_response(
+        request, current_user.school_id or "default_school", ("students",), {}, load_student
+    )
+
+@api_router.get("/students/{student_id}/summary")
+async def get_student_summary(student_id: str, current_user: User = Depends(get_current_user)):
+    """Get a student's attendance counts per month and overall"""
+    school_id = current_user.school_id or "default_school"
+    summary = await db.attendance_summaries.find_one({"student_id": student_id, "school_id": school_id}, {"_id": 0})
+    if not summary or not summary.get("backfilled"):
+        # First lookup for this student: count their history once
+        student = await db.students.find_one({"id": student_id, "school_id": school_id}, {"_id": 0, "school_id": 1})
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        summary = await rebuild_student_summary(student_id, student["school_id"])
+    
+    totals = {status_name: summary.get("totals", {}).get(status_name, 0) for status_name in ATTENDANCE_STATUSES}
+    months = []
+    for month, month_counts in sorted(summary.get("months", {}).items()):
+        counts = {status_name: month_counts.get(status_name, 0) for status_name in ATTENDANCE_STATUSES}
+        months.append({"month": month, **counts, "attendance_rate": attendance_rate(counts)})
     
-    return Student(**student)
+    return {
+        "student_id": student_id,
+        "totals": totals,
+        "total_marked": sum(totals.values()),
+        "attendance_rate": attendance_rate(totals),
+        "months": months,
+        "updated_at": summary.get("updated_at")
+    }
 
 # Attendance Routes
-@api_router.post("/attendance/mark")
+MARK_CHUNK_SIZE = 100
+
+@api_router.post("/attendance/mark", dependencies=[Depends(admission_control("marking"))])
 async def mark_attendance(
     request: AttendanceMarkRequest,
     current_user: User = Depends(get_current_user)
 ):
     """Mark attendance for multiple students"""
-    attendance_records = []
+    created = await mark_students_attendance(request, current_user.id, current_user.school_id or "default_school")
+    return {"message": f"Attendance marked for {len(request.student_ids)} students", "records": created}
+
+async def mark_students_attendance(request: AttendanceMarkRequest, user_id: str, school_id: str,
+                                   progress=None) -> int:
+    """Mark attendance for multiple students, returning how many records were created"""
+    created = 0
     
-    for student_id in request.student_ids:
-        # Check if already marked for today
-        existing = await db.attendance.find_one({
-            "student_id": student_id,
-            "date": request.date
-        })
+    # Students are marked in chunks, each reserving its summaries first and
+    # releasing them with its counter changes
+    for start in range(0, len(request.student_ids), MARK_CHUNK_SIZE):
+        if progress and start:
+            await progress(start * 100 / len(request.student_ids), f"Marked {start} students")
         
-        if existing:
-            # Update existing record
-            await db.attendance.update_one(
-                {"student_id": student_id, "date": request.date},
-                {"$set": {
-                    "status": request.status,
-                    "marked_by": current_user.id,
-                    "marked_at": datetime.now(timezone.utc),
-                    "method": request.method
-                }}
-            )
-        else:
-            # Create new record
-            attendance = AttendanceRecord(
-                student_id=student_id,
-                school_id=current_user.school_id or "default_school",
-                class_name="",  # Will be filled from student data
-                section="",
-                date=request.date,
-                status=request.status,
-                marked_by=current_user.id,
-                method=request.method
-            )
+        chunk = request.student_ids[start:start + MARK_CHUNK_SIZE]
+        reservations: Dict[tuple, int] = {}
+        for student_id in chunk:
+            add_summary_reservation(reservations, student_id, school_id)
+        await reserve_summaries(reservations)
+        
+        summary_changes: Dict[tuple, Dict[str, int]] = {}
+        try:
+            for student_id in chunk:
+                previous = await write_attendance_mark(student_id, request, user_id, school_id)
+                if previous is None:
+                    created += 1
+                
+                previous = previous or {}
+                add_summary_change(
+                    summary_changes, student_id, previous.get("school_id", school_id),
+                    request.date, previous.get("status"), request.status
+                )
+        finally:
+            await apply_summary_changes(summary_changes, reservations)
+    
+    await publish_invalidation("attendance", school_id=school_id)
+    
+    return created
+
+async def write_attendance_mark(student_id: str, request: AttendanceMarkRequest, user_id: str,
+                                school_id: str) -> Optional[Dict[str, Any]]:
+    """Write one student's mark, returning the record as it was before, or None if it was created"""
+    # Update the record in place; the document from before the update gives
+    # the status change, so concurrent re-marks never double-count
+    record_filter = {"student_id": student_id, "date": request.date}
+    marked = {
+        "status": request.status,
+        "marked_by": user_id,
+        "marked_at": datetime.now(timezone.utc),
+        "method": request.method
+    }
+    previous = await db.attendance.find_one_and_update(
+        record_filter,
+        {"$set": marked},
+        projection={"_id": 0, "status": 1, "school_id": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is not None:
+        return previous
+    
+    # Create new record
+    attendance = AttendanceRecord(
+        student_id=student_id,
+        school_id=school_id,
+        class_name="",  # Will be filled from student data
+        section="",
+        date=request.date,
+        status=request.status,
+        marked_by=user_id,
+        method=request.method
+    )
+    
+    # Get student info
+    student = await db.students.find_one({"id": student_id}, STUDENT_CLASS_PROJECTION)
+    if student:
+        attendance.class_name = student["class_name"]
+        attendance.section = student["section"]
+    
+    # Upsert in case another request created the record in the meantime
+    record = attendance.dict()
+    return await db.attendance.find_one_and_update(
+        record_filter,
+        {
+            "$set": marked,
+            "$setOnInsert": {key: value for key, value in record.items() if key not in marked}
+        },
+        projection={"_id": 0, "status": 1, "school_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+
+@api_router.websocket("/attendance/kiosk")
+async def kiosk_recognition(websocket: WebSocket, class_name: str, section: str):
+    """Mark attendance from a stream of JPEG frames sent by a classroom kiosk"""
+    await websocket.accept()
+    current_user = await get_websocket_user(websocket)
+    if not current_user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    school_id = current_user.school_id or "default_school"
+    index = await get_class_embedding_index(school_id, class_name, section)
+    await websocket.send_json({"type": "ready", "enrolled_students": len(index["student_ids"])})
+    
+    # The receiver only keeps the newest frame; frames arriving while one is
+    # being analyzed are dropped rather than queued
+    latest_frame: Dict[str, Optional[bytes]] = {"frame": None}
+    frame_ready = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    
+    async def process_frames():
+        previous_signature = None
+        last_processed = 0.0
+        last_analyzed = float("-inf")
+        last_seen: Dict[str, float] = {}
+        
+        while True:
+            await frame_ready.wait()
+            delay = KIOSK_FRAME_INTERVAL - (loop.time() - last_processed)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            frame_ready.clear()
+            frame, latest_frame["frame"] = latest_frame["frame"], None
+            last_processed = loop.time()
             
-            # Get student info
-            student = await db.students.find_one({"id": student_id})
-            if student:
-                attendance.class_name = student["class_name"]
-                attendance.section = student["section"]
+            # Skip the duplicate check now and then, so a missed face is retried
+            if last_processed - last_analyzed >= KIOSK_FULL_ANALYSIS_INTERVAL:
+                previous_signature = None
+            
+            result = await run_face_task(analyze_kiosk_frame, frame, previous_signature)
+            if "error" in result:
+                await websocket.send_json({"type": "error", "detail": result["error"]})
+                continue
+            if result["duplicate"]:
+                continue
+            previous_signature = result["signature"]
+            last_analyzed = last_processed
+            
+            index = await get_class_embedding_index(school_id, class_name, section)
+            for embedding in result["faces"]:
+                match = match_face_embedding(index, embedding)
+                if not match:
+                    continue
+                
+                # Debounce repeat sightings of the same student
+                now = loop.time()
+                if now - last_seen.get(match["student_id"], float("-inf")) < KIOSK_DEBOUNCE_SECONDS:
+                    continue
+                last_seen[match["student_id"]] = now
+                
+                queue_kiosk_mark(
+                    match["student_id"], school_id, class_name, section,
+                    current_user.id, match["confidence"]
+                )
+                await websocket.send_json({"type": "recognized", **match})
+    
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            
+            frame = message.get("bytes")
+            if not frame:
+                continue
+            if len(frame) > KIOSK_MAX_FRAME_BYTES:
+                await websocket.send_json({"type": "error", "detail": "Frame too large"})
+                continue
             
-            await db.attendance.insert_one(attendance.dict())
-            attendance_records.append(attendance)
+            latest_frame["frame"] = frame
+            frame_ready.set()
+    
+    # Whichever side stops first (client disconnect or a processing error) ends the session
+    processor = asyncio.create_task(process_frames())
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        await asyncio.wait({processor, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        processor.cancel()
+        receiver.cancel()
+        processing_error, _ = await asyncio.gather(processor, receiver, return_exceptions=True)
     
-    return {"message": f"Attendance marked for {len(request.student_ids)} students", "records": len(attendance_records)}
+    if isinstance(processing_error, Exception):
+        logger.error(f"Kiosk frame processing failed for {school_id} {class_name}-{section}",
+                     exc_info=processing_error)
+        try:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        except Exception:
+            # The socket is already gone, e.g. the failure was a send to a closed client
+            pass
 
 @api_router.get("/attendance")
 async def get_attendance(
+    request: Request,
     date: str,
     class_name: Optional[str] = None,
     section: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get attendance records for a specific date"""
+    school_id = current_user.school_id or "default_school"
     query = {
-        "school_id": current_user.school_id or "default_school",
+        "school_id": school_id,
         "date": date
     }
     
@@ -445,27 +2271,42 @@ async def get_attendance(
     if section:
         query["section"] = section
     
-    records = await db.attendance.find(query).to_list(1000)
+    async def load_attendance():
+        records = await db.attendance.find(query, ATTENDANCE_PROJECTION).to_list(1000)
+        
+        # Enrich with student data
+        enriched_records = []
+        for record in records:
+            student = await db.students.find_one({"id": record["student_id"]}, STUDENT_NAME_PROJECTION)
+            if student:
+                record["student_name"] = student["name"]
+                record["roll_number"] = student["roll_number"]
+            enriched_records.append(record)
+        
+        return enriched_records
     
-    # Enrich with student data
-    enriched_records = []
-    for record in records:
-        student = await db.students.find_one({"id": record["student_id"]})
-        if student:
-            record["student_name"] = student["name"]
-            record["roll_number"] = student["roll_number"]
-        enriched_records.append(record)
+    # Today's attendance is still being marked; only past dates are cached
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    if date >= today:
+        return FastJSONResponse(await load_attendance())
     
-    return enriched_records
+    return await cached_json_response(
+        request, school_id, ("students", "attendance"),
+        {"date": date, "class_name": class_name, "section": section},
+        load_attendance
+    )
 
-@api_router.post("/reports/attendance", response_model=List[AttendanceReportRecord])
+@api_router.post("/reports/attendance", response_model=List[AttendanceReportRecord], dependencies=[Depends(admission_control("analytics"))])
 async def generate_attendance_report(
     request: AttendanceReportRequest,
     current_user: User = Depends(get_current_user)
 ):
     """Generate detailed attendance report based on filters"""
-    
-    query = {"school_id": current_user.school_id or "default_school"}
+    return FastJSONResponse(await build_attendance_report(current_user.school_id or "default_school", request))
+
+async def build_attendance_report(school_id: str, request: AttendanceReportRequest, progress=None) -> List[Dict[str, Any]]:
+    """Build attendance report rows shaped like AttendanceReportRecord"""
+    query = {"school_id": school_id}
     
     if request.class_name:
         query["class_name"] = request.class_name
@@ -479,44 +2320,50 @@ async def generate_attendance_report(
     elif request.end_date:
         query["date"] = {"$lte": request.end_date}
 
-    attendance_records = await db.attendance.find(query).to_list(10000)
+    attendance_records = await db.attendance.find(query, ATTENDANCE_PROJECTION).to_list(10000)
     
-    # Enrich with student data
+    # Enrich with student data; rows are plain dicts shaped like AttendanceReportRecord
     enriched_records = []
-    for record in attendance_records:
-        student = await db.students.find_one({"id": record["student_id"]})
+    for position, record in enumerate(attendance_records):
+        if progress and position and position % 500 == 0:
+            await progress(position * 100 / len(attendance_records), f"Processed {position} records")
+        student = await db.students.find_one({"id": record["student_id"]}, STUDENT_NAME_PROJECTION)
         if student:
-            enriched_records.append(AttendanceReportRecord(
-                student_id=record["student_id"],
-                student_name=student["name"],
-                roll_number=student["roll_number"],
-                class_name=record["class_name"],
-                section=record["section"],
-                date=record["date"],
-                status=record["status"],
-                marked_by=record["marked_by"],
-                method=record["method"],
-                confidence_score=record.get("confidence_score")
-            ))
+            enriched_records.append({
+                "student_id": record["student_id"],
+                "student_name": student["name"],
+                "roll_number": student["roll_number"],
+                "class_name": record["class_name"],
+                "section": record["section"],
+                "date": record["date"],
+                "status": record["status"],
+                "marked_by": record["marked_by"],
+                "method": record["method"],
+                "confidence_score": record.get("confidence_score")
+            })
     
     return enriched_records
 
 # Analytics Routes
-@api_router.post("/analytics/insights")
+@api_router.post("/analytics/insights", dependencies=[Depends(admission_control("analytics"))])
 async def get_analytics_insights(
     request: AnalyticsRequest,
     current_user: User = Depends(get_current_user)
 ):
     """Get AI-powered analytics insights"""
-    
+    return await build_analytics_insights(current_user.role, current_user.school_id, request)
+
+async def build_analytics_insights(role: str, user_school_id: Optional[str], request: AnalyticsRequest,
+                                   progress=None) -> Dict[str, Any]:
+    """Compute attendance statistics and AI insights visible to a user role"""
     # Build query based on user role and request
     base_query = {}
     
-    if current_user.role == "teacher":
-        base_query["school_id"] = current_user.school_id or "default_school"
-    elif current_user.role == "administrator":
-        base_query["school_id"] = request.school_id or current_user.school_id or "default_school"
-    elif current_user.role == "district_officer":
+    if role == "teacher":
+        base_query["school_id"] = user_school_id or "default_school"
+    elif role == "administrator":
+        base_query["school_id"] = request.school_id or user_school_id or "default_school"
+    elif role == "district_officer":
         if request.district_id:
             # In a real system, we'd filter by district
             pass
@@ -529,10 +2376,14 @@ async def get_analytics_insights(
             base_query["date"] = {"$gte": start_date, "$lte": end_date}
     
     # Get attendance data
-    attendance_records = await db.attendance.find(base_query).to_list(10000)
+    if progress:
+        await progress(5, "Loading attendance records")
+    attendance_records = await db.attendance.find(base_query, {"_id": 0, "status": 1, "class_name": 1}).to_list(10000)
     
     # Get student data
-    students = await db.students.find({"school_id": base_query.get("school_id", "default_school")}).to_list(1000)
+    students = await db.students.find(
+        {"school_id": base_query.get("school_id", "default_school")}, {"_id": 0, "id": 1}
+    ).to_list(1000)
     
     # Prepare analytics data
     analytics_data = {
@@ -558,6 +2409,8 @@ async def get_analytics_insights(
     analytics_data["attendance_by_class"] = class_counts
     
     # Generate AI insights
+    if progress:
+        await progress(60, "Generating AI insights")
     ai_insights = await generate_ai_insights(analytics_data)
     
     return {
@@ -599,12 +2452,125 @@ async def get_dashboard_data(current_user: User = Depends(get_current_user)):
         "user_role": current_user.role
     }
 
+# Job Routes
+@api_router.post("/jobs/reports/attendance", status_code=202, dependencies=[Depends(rate_limit("analytics"))])
+async def submit_attendance_report_job(
+    request: AttendanceReportRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue an attendance report to be generated in the background"""
+    return await submit_job(
+        "attendance_report", current_user.school_id or "default_school", current_user.id,
+        request.dict()
+    )
+
+@api_router.post("/jobs/analytics/insights", status_code=202, dependencies=[Depends(rate_limit("analytics"))])
+async def submit_analytics_insights_job(
+    request: AnalyticsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue AI-powered analytics insights to be computed in the background"""
+    return await submit_job(
+        "analytics_insights", current_user.school_id or "default_school", current_user.id,
+        {**request.dict(), "role": current_user.role}
+    )
+
+@api_router.post("/jobs/attendance/mark", status_code=202, dependencies=[Depends(rate_limit("marking"))])
+async def submit_mark_attendance_job(
+    request: AttendanceMarkRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue attendance marking for a large batch of students"""
+    return await submit_job(
+        "mark_attendance", current_user.school_id or "default_school", current_user.id,
+        request.dict()
+    )
+
+async def get_school_job(job_id: str, current_user: User, projection: Dict[str, Any]) -> Dict[str, Any]:
+    """Load a job belonging to the current user's school"""
+    job = await db.jobs.find_one(
+        {"id": job_id, "school_id": current_user.school_id or "default_school"}, projection
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user: User = Depends(get_current_user)):
+    """Get the status and progress of a background job"""
+    job = await get_school_job(job_id, current_user, JOB_STATUS_PROJECTION)
+    if job["status"] == "completed":
+        job["result_url"] = f"/api/jobs/{job_id}/result"
+    return job
+
+@api_router.get("/jobs/{job_id}/result")
+async def download_job_result(job_id: str, format: str = "json", current_user: User = Depends(get_current_user)):
+    """Download the result of a completed background job"""
+    job = await get_school_job(job_id, current_user, {"_id": 0, "kind": 1, "status": 1, "result": 1})
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    
+    result = job.get("result")
+    filename = f"{job['kind']}_{job_id}"
+    if format == "csv":
+        if not isinstance(result, list):
+            raise HTTPException(status_code=400, detail="CSV is only available for tabular results")
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(result[0].keys()) if result else [])
+        writer.writeheader()
+        writer.writerows(result)
+        return Response(
+            content=buffer.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        )
+    
+    return FastJSONResponse(
+        result, headers={"Content-Disposition": f'attachment; filename="{filename}.json"'}
+    )
+
+# Health Routes
+@api_router.get("/health/startup")
+async def get_startup_timings(current_user: User = Depends(require_role("administrator", "district_officer"))):
+    """Get the import and init cost breakdown of this worker"""
+    return {
+        "pid": os.getpid(),
+        "timings_ms": {name: round(ms, 2) for name, ms in STARTUP_TIMINGS.items()},
+        "numpy_loaded": _numpy is not None,
+        "image_stack_loaded": _image_stack is not None,
+        "llm_client_loaded": _llm_client is not None
+    }
+
+@api_router.get("/health/admission")
+async def get_admission_stats(current_user: User = Depends(require_role("administrator", "district_officer"))):
+    """Get the load of each admission control pool in this worker"""
+    return {name: pool.stats() for name, pool in admission_pools.items()}
+
+@api_router.get("/health/queries")
+async def get_query_profile(current_user: User = Depends(require_role("administrator", "district_officer"))):
+    """Get profiled query statistics and the slow-query log of this worker"""
+    queries = sorted(query_stats.values(), key=lambda stats: stats["total_ms"], reverse=True)
+    return {
+        "enabled": MONGO_PROFILING,
+        "slow_query_ms": MONGO_SLOW_QUERY_MS,
+        "queries": [
+            {**stats, "avg_ms": round(stats["total_ms"] / stats["count"], 2)}
+            for stats in queries
+        ],
+        "slow_queries": list(slow_queries)
+    }
+
 # Classes and sections helper
 @api_router.get("/classes")
-async def get_classes(current_user: User = Depends(get_current_user)):
+async def get_classes(request: Request, current_user: User = Depends(get_current_user)):
     """Get all classes in the school"""
     school_id = current_user.school_id or "default_school"
-    
+    return await cached_json_response(
+        request, school_id, ("students",), {}, lambda: load_classes(school_id)
+    )
+
+async def load_classes(school_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Group the school's students into classes and sections"""
     # Get unique classes and sections
     pipeline = [
         {"$match": {"school_id": school_id}},
@@ -642,10 +2608,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-
 # Root endpoint
 @app.get("/")
 async def root():
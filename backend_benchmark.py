@@ -0,0 +1,240 @@
+import sys
+import json
+import gzip
+import time
+import uuid
+import subprocess
+import io
+import resource
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import bson
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import server
+
+class ShikshaConnectBenchmark:
+    def __init__(self, rows=10000, repeat=5):
+        self.rows = rows
+        self.repeat = repeat
+
+    def timed(self, func):
+        """Return the best wall time of several runs in milliseconds"""
+        best = float("inf")
+        result = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, result
+
+    def report_rows(self):
+        """Build report rows shaped like trusted DB output"""
+        return [
+            {
+                "student_id": str(uuid.uuid4()),
+                "student_name": f"Student {i}",
+                "roll_number": f"R{i:05d}",
+                "class_name": str(1 + i % 12),
+                "section": "ABCD"[i % 4],
+                "date": "2024-07-01",
+                "status": ("present", "absent", "late")[i % 3],
+                "marked_by": str(uuid.uuid4()),
+                "method": "manual",
+                "confidence_score": None
+            }
+            for i in range(self.rows)
+        ]
+
+    def student_rows(self):
+        """Build student documents shaped like trusted DB output"""
+        return [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Student {i}",
+                "roll_number": f"R{i:05d}",
+                "class_name": str(1 + i % 12),
+                "section": "ABCD"[i % 4],
+                "date_of_birth": "2012-01-01",
+                "parent_name": f"Parent {i}",
+                "parent_contact": "9999999999",
+                "school_id": "default_school",
+                "created_at": datetime.now(timezone.utc),
+                "photo_url": None,
+                "facial_embeddings": None,
+                "enrollment_status": "active"
+            }
+            for i in range(self.rows)
+        ]
+
+    def bench_serialization(self):
+        """Compare the Pydantic + default encoder path with the orjson fast path"""
+        print(f"\n🔍 JSON serialization ({self.rows} rows, best of {self.repeat})")
+        cases = [
+            ("students", List[server.Student], self.student_rows()),
+            ("report", List[server.AttendanceReportRecord], self.report_rows()),
+        ]
+        for name, model, rows in cases:
+            adapter = TypeAdapter(model)
+
+            def default_path():
+                validated = adapter.validate_python(rows)
+                return json.dumps(jsonable_encoder(validated), separators=(",", ":")).encode()
+
+            default_ms, default_body = self.timed(default_path)
+            fast_ms, fast_body = self.timed(lambda: server.dump_json(rows))
+            print(f"   {name:<10} default: {default_ms:8.1f} ms   orjson: {fast_ms:8.1f} ms   "
+                  f"speedup: {default_ms / fast_ms:5.1f}x   size: {len(fast_body) / 1024:.0f} KB")
+
+    def bench_compression(self):
+        """Compare payload size and cost of gzip and brotli on a report response"""
+        print(f"\n🔍 Response compression ({self.rows} report rows)")
+        body = server.dump_json(self.report_rows())
+        print(f"   identity   {len(body) / 1024:8.0f} KB")
+
+        gzip_ms, gzipped = self.timed(lambda: gzip.compress(body, compresslevel=6))
+        print(f"   gzip       {len(gzipped) / 1024:8.0f} KB   {gzip_ms:8.1f} ms")
+
+        if server.BROTLI_AVAILABLE:
+            br_ms, compressed = self.timed(lambda: server.brotli.compress(body, quality=4))
+            print(f"   brotli     {len(compressed) / 1024:8.0f} KB   {br_ms:8.1f} ms")
+        else:
+            print("   brotli     skipped (Brotli package not installed)")
+
+    def bench_startup(self):
+        """Break down the import and init cost of a fresh API worker"""
+        print("\n🔍 Worker startup (fresh interpreter)")
+        script = (
+            "import time, json; started = time.perf_counter(); import server; "
+            "total = (time.perf_counter() - started) * 1000; server.load_image_stack(); "
+            "server.load_llm_client(); print(json.dumps({'import server': total, **server.STARTUP_TIMINGS}))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=Path(__file__).parent / "backend",
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        for name, ms in json.loads(output).items():
+            print(f"   {name:<22} {ms:8.1f} ms")
+
+    def bench_embeddings(self, students=1000, queries=2000, noise=2.5):
+        """Compare packed embedding storage with the float32 baseline"""
+        print(f"\n🔍 Embedding storage ({students} students, {queries} noisy queries)")
+        rng = np.random.default_rng(7)
+        enrolled = rng.standard_normal((students, server.FACE_EMBEDDING_SIZE)).astype(np.float32)
+        enrolled /= np.linalg.norm(enrolled, axis=1, keepdims=True)
+        targets = rng.integers(0, students, queries)
+        probes = enrolled[targets] + noise * rng.standard_normal((queries, server.FACE_EMBEDDING_SIZE)).astype(np.float32) / np.sqrt(server.FACE_EMBEDDING_SIZE)
+
+        def top1(matrix):
+            normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+            scores = probes @ normalized.T
+            return scores.argmax(axis=1), scores.max(axis=1)
+
+        baseline_match, baseline_score = top1(enrolled)
+        legacy_docs = [bson.encode({"facial_embeddings": [float(v) for v in row]}) for row in enrolled]
+        legacy_ms, _ = self.timed(lambda: np.array(
+            [bson.decode(doc)["facial_embeddings"] for doc in legacy_docs], dtype=np.float32
+        ))
+        print(f"   float64 list   {len(legacy_docs[0]):5d} B/doc   decode: {legacy_ms:6.1f} ms   "
+              f"top-1 accuracy: {(baseline_match == targets).mean() * 100:6.2f}%")
+
+        for storage_format in ("float16", "int8"):
+            docs = [bson.encode(server.pack_embedding([float(v) for v in row], storage_format)) for row in enrolled]
+            decode_ms, matrix = self.timed(lambda: server.unpack_embeddings([bson.decode(doc) for doc in docs]))
+            match, score = top1(matrix)
+            print(f"   {storage_format:<14} {len(docs[0]):5d} B/doc   decode: {decode_ms:6.1f} ms   "
+                  f"top-1 accuracy: {(match == targets).mean() * 100:6.2f}%   "
+                  f"agreement: {(match == baseline_match).mean() * 100:6.2f}%   "
+                  f"max score error: {np.abs(score - baseline_score).max():.4f}")
+
+    def bench_photo_pipeline(self, width=4032, height=3024):
+        """Compare per-photo latency and peak memory of the photo pipelines on a phone-sized JPEG"""
+        print(f"\n🔍 Photo pipeline ({width}x{height} JPEG, best of {self.repeat}, fresh process each)")
+        _, _, Image = server.load_image_stack()
+        rng = np.random.default_rng(7)
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        pixels = gradient + rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as photo:
+            photo.write(buffer.getvalue())
+            photo.flush()
+            print(f"   input      {len(buffer.getvalue()) / 1024 / 1024:8.1f} MB")
+            for pipeline in ("legacy", "quality", "fast"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--photo-child", pipeline, photo.name, str(self.repeat)],
+                    capture_output=True, text=True, check=True
+                ).stdout.strip().splitlines()[-1]
+                stats = json.loads(output)
+                print(f"   {pipeline:<10} {stats['ms']:8.1f} ms   peak memory: +{stats['peak_mb']:.0f} MB")
+
+def legacy_photo_pipeline(image_data):
+    """The photo pipeline before the fast path: full decode, 512x512 LANCZOS, BGR round-trip"""
+    cv2, np_, Image = server.load_image_stack()
+    image = Image.open(io.BytesIO(image_data)).convert('RGB').resize((512, 512), Image.Resampling.LANCZOS)
+    cv_image = cv2.cvtColor(np_.array(image), cv2.COLOR_RGB2BGR)
+    server.get_face_cascade().detectMultiScale(cv_image, 1.1, 4)
+    processed = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
+    processed.save(io.BytesIO(), format='JPEG', quality=85)
+
+def preset_photo_pipeline(image_data, preset):
+    """The current photo pipeline, run stage by stage so encoding happens even without a face"""
+    image = server.load_photo(image_data, preset)
+    server.detect_photo_faces(image, preset)
+    server.encode_photo(image, preset)
+
+def peak_rss_kb():
+    """Peak resident memory of this process in KB"""
+    # VmHWM starts fresh at exec; ru_maxrss can inherit the parent's peak on Linux
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_photo_child(pipeline, path, repeat):
+    """Time one photo pipeline in a fresh process and report its peak memory growth"""
+    image_data = Path(path).read_bytes()
+    server.load_image_stack()
+    server.get_face_cascade()
+    baseline_kb = peak_rss_kb()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if pipeline == "legacy":
+            legacy_photo_pipeline(image_data)
+        else:
+            preset_photo_pipeline(image_data, server.PHOTO_PIPELINE_PRESETS[pipeline])
+        best = min(best, time.perf_counter() - start)
+    peak_kb = peak_rss_kb()
+    print(json.dumps({"ms": best * 1000, "peak_mb": (peak_kb - baseline_kb) / 1024}))
+
+def main():
+    """Main benchmark function"""
+    if len(sys.argv) == 5 and sys.argv[1] == "--photo-child":
+        run_photo_child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return 0
+
+    print("🚀 Starting Shiksha-Connect Benchmarks")
+    print("=" * 50)
+
+    benchmark = ShikshaConnectBenchmark()
+    benchmark.bench_startup()
+    benchmark.bench_serialization()
+    benchmark.bench_compression()
+    benchmark.bench_embeddings()
+    benchmark.bench_photo_pipeline()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import mongomock.aggregate
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# The backend is a single module run from its own directory
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import server
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """Point the server at an in-memory MongoDB"""
+    # mongomock lacks $substrCP; dates are ASCII, so $substr gives the same month
+    handle_string_operator = mongomock.aggregate._Parser._handle_string_operator
+
+    def substr_cp_as_substr(self, operator, values):
+        return handle_string_operator(self, "$substr" if operator == "$substrCP" else operator, values)
+
+    monkeypatch.setattr(mongomock.aggregate._Parser, "_handle_string_operator", substr_cp_as_substr)
+    database = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "SUMMARY_REBUILD_RETRY_DELAY", 0.01)
+    return database
@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def build_pool(**overrides):
+    options = {"concurrency": 1, "queue_size": 1, "queue_timeout": 0.05, "rate": 1.0, "burst": 100}
+    options.update(overrides)
+    return server.AdmissionPool("test", **options)
+
+
+async def hold_slot(pool, school_id, entered, release):
+    async with pool.admit(school_id):
+        entered.set()
+        await release.wait()
+
+
+def test_token_bucket_allows_burst_then_reports_wait(clock):
+    bucket = server.TokenBucket(rate=2.0, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+
+def test_token_bucket_refills_over_time_up_to_capacity(clock):
+    bucket = server.TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.try_acquire()
+
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() > 0
+
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() > 0
+
+
+def test_admit_rejects_with_retry_after_when_rate_exceeded(clock):
+    pool = build_pool(rate=0.1, burst=2)
+
+    async def scenario():
+        for _ in range(2):
+            async with pool.admit("school-a"):
+                pass
+        with pytest.raises(HTTPException) as rejected:
+            async with pool.admit("school-a"):
+                pass
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "10"
+    assert pool.rejected == 1
+
+
+def test_admit_keeps_a_bucket_per_school(clock):
+    pool = build_pool(rate=0.1, burst=1)
+
+    async def scenario():
+        async with pool.admit("school-a"):
+            pass
+        async with pool.admit("school-b"):
+            pass
+        with pytest.raises(HTTPException):
+            async with pool.admit("school-a"):
+                pass
+
+    asyncio.run(scenario())
+
+
+def test_admit_rejects_when_wait_queue_is_full():
+    pool = build_pool(queue_size=0)
+
+    async def scenario():
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold_slot(pool, "school-a", entered, release))
+        await entered.wait()
+        try:
+            with pytest.raises(HTTPException) as rejected:
+                async with pool.admit("school-b"):
+                    pass
+        finally:
+            release.set()
+            await holder
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert "Too many pending" in error.detail
+
+
+def test_admit_rejects_after_queue_timeout():
+    pool = build_pool(queue_size=1, queue_timeout=0.01)
+
+    async def scenario():
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold_slot(pool, "school-a", entered, release))
+        await entered.wait()
+        try:
+            with pytest.raises(HTTPException) as rejected:
+                async with pool.admit("school-b"):
+                    pass
+        finally:
+            release.set()
+            await holder
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert "Timed out" in error.detail
+    assert pool.waiting == 0
+
+
+def test_admit_tracks_and_releases_slots():
+    pool = build_pool(concurrency=2)
+
+    async def scenario():
+        async with pool.admit("school-a"):
+            assert pool.in_flight == 1
+            async with pool.admit("school-a"):
+                assert pool.in_flight == 2
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0
+    assert stats["waiting"] == 0
+    assert stats["rejected"] == 0
+    assert not pool.semaphore.locked()
+
+
+def test_check_rate_charges_the_bucket_without_holding_a_slot(clock):
+    pool = build_pool(rate=0.1, burst=1)
+
+    pool.check_rate("school-a")
+    assert pool.in_flight == 0
+    with pytest.raises(HTTPException) as rejected:
+        pool.check_rate("school-a")
+    assert rejected.value.status_code == 429
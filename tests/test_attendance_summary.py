@@ -0,0 +1,79 @@
+import pytest
+
+import server
+
+
+def changes_for(*transitions):
+    changes = {}
+    for date, old_status, new_status in transitions:
+        server.add_summary_change(changes, "student-1", "school-1", date, old_status, new_status)
+    return changes
+
+
+def test_new_mark_increments_month_and_total():
+    changes = changes_for(("2024-07-15", None, "present"))
+
+    assert changes == {("student-1", "school-1"): {"months.2024-07.present": 1, "totals.present": 1}}
+
+
+def test_status_change_moves_the_count():
+    changes = changes_for(("2024-07-15", "present", "late"))
+
+    assert changes[("student-1", "school-1")] == {
+        "months.2024-07.present": -1,
+        "totals.present": -1,
+        "months.2024-07.late": 1,
+        "totals.late": 1,
+    }
+
+
+def test_unchanged_status_adds_nothing():
+    assert changes_for(("2024-07-15", "absent", "absent")) == {}
+
+
+def test_changes_accumulate_across_days_and_months():
+    changes = changes_for(
+        ("2024-07-15", None, "present"),
+        ("2024-07-16", None, "present"),
+        ("2024-08-01", None, "absent"),
+    )
+
+    assert changes[("student-1", "school-1")] == {
+        "months.2024-07.present": 2,
+        "months.2024-08.absent": 1,
+        "totals.present": 2,
+        "totals.absent": 1,
+    }
+
+
+def test_round_trip_transition_cancels_out():
+    changes = changes_for(
+        ("2024-07-15", "present", "absent"),
+        ("2024-07-15", "absent", "present"),
+    )
+
+    assert set(changes[("student-1", "school-1")].values()) == {0}
+
+
+def test_unknown_statuses_are_ignored():
+    changes = changes_for(("2024-07-15", "excused", "present"))
+
+    assert changes[("student-1", "school-1")] == {"months.2024-07.present": 1, "totals.present": 1}
+
+
+def test_students_are_tracked_separately():
+    changes = {}
+    server.add_summary_change(changes, "student-1", "school-1", "2024-07-15", None, "present")
+    server.add_summary_change(changes, "student-2", "school-1", "2024-07-15", None, "absent")
+
+    assert set(changes) == {("student-1", "school-1"), ("student-2", "school-1")}
+
+
+@pytest.mark.parametrize("counts, expected", [
+    ({"present": 3, "late": 1, "absent": 4}, 50.0),
+    ({"present": 2}, 100.0),
+    ({"absent": 2}, 0.0),
+    ({}, 0.0),
+])
+def test_attendance_rate_counts_late_as_attended(counts, expected):
+    assert server.attendance_rate(counts) == pytest.approx(expected)
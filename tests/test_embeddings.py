@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import server
+
+
+def sample_embedding(seed=7):
+    vector = np.random.default_rng(seed).standard_normal(server.FACE_EMBEDDING_SIZE)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_int8_round_trip_is_within_half_a_step():
+    embedding = sample_embedding()
+    document = server.pack_embedding(embedding, "int8")
+
+    assert document["facial_embedding_format"] == "int8"
+    assert len(document["facial_embeddings"]) == server.FACE_EMBEDDING_SIZE
+    decoded = server.unpack_embeddings([document])[0]
+    assert np.abs(decoded - embedding).max() <= document["facial_embedding_scale"] / 2 + 1e-6
+
+
+def test_int8_uses_the_full_range():
+    embedding = sample_embedding()
+    document = server.pack_embedding(embedding, "int8")
+
+    quantized = np.frombuffer(document["facial_embeddings"], dtype=np.int8)
+    assert np.abs(quantized).max() == 127
+
+
+def test_float16_round_trip():
+    embedding = sample_embedding()
+    document = server.pack_embedding(embedding, "float16")
+
+    assert document["facial_embedding_format"] == "float16"
+    assert len(document["facial_embeddings"]) == 2 * server.FACE_EMBEDDING_SIZE
+    decoded = server.unpack_embeddings([document])[0]
+    np.testing.assert_allclose(decoded, embedding, atol=1e-3)
+
+
+def test_round_trip_preserves_nearest_match():
+    enrolled = [sample_embedding(seed) for seed in range(20)]
+    probe = np.asarray(enrolled[5]) + 0.05 * np.random.default_rng(99).standard_normal(server.FACE_EMBEDDING_SIZE)
+
+    for storage_format in server.EMBEDDING_STORAGE_FORMATS:
+        matrix = server.unpack_embeddings([server.pack_embedding(e, storage_format) for e in enrolled])
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        assert int(np.argmax(matrix @ probe)) == 5
+
+
+def test_zero_embedding_packs_without_dividing_by_zero():
+    document = server.pack_embedding([0.0] * server.FACE_EMBEDDING_SIZE, "int8")
+
+    assert document["facial_embedding_scale"] == 1.0
+    assert not server.unpack_embeddings([document]).any()
+
+
+def test_unpack_reads_legacy_float_lists():
+    embedding = sample_embedding()
+    document = {"facial_embeddings": embedding}
+
+    np.testing.assert_allclose(server.unpack_embeddings([document])[0], embedding, rtol=1e-6)
+    assert server.stored_embedding_size(document) == server.FACE_EMBEDDING_SIZE
+
+
+def test_unpack_mixes_formats_in_one_matrix():
+    embedding = sample_embedding()
+    documents = [
+        server.pack_embedding(embedding, "int8"),
+        server.pack_embedding(embedding, "float16"),
+        {"facial_embeddings": embedding},
+    ]
+
+    matrix = server.unpack_embeddings(documents)
+    assert matrix.shape == (3, server.FACE_EMBEDDING_SIZE)
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix, np.tile(embedding, (3, 1)), atol=0.01)
+
+
+@pytest.mark.parametrize("storage_format", ["int8", "float16"])
+def test_stored_embedding_size_of_packed_documents(storage_format):
+    document = server.pack_embedding(sample_embedding(), storage_format)
+
+    assert server.stored_embedding_size(document) == server.FACE_EMBEDDING_SIZE
+
+
+def test_unknown_storage_format_is_rejected():
+    with pytest.raises(ValueError):
+        server.pack_embedding(sample_embedding(), "float32")
@@ -0,0 +1,28 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+ADMIN_ONLY_ROUTES = ["/api/health/startup", "/api/health/admission", "/api/health/queries"]
+
+
+@pytest.fixture
+def client_as():
+    def login(role):
+        user = server.User(email="user@example.com", name="User", role=role, school_id="school-1")
+        server.app.dependency_overrides[server.get_current_user] = lambda: user
+        return TestClient(server.app)
+
+    yield login
+    server.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("path", ADMIN_ONLY_ROUTES)
+def test_teachers_cannot_read_worker_diagnostics(client_as, path):
+    assert client_as("teacher").get(path).status_code == 403
+
+
+@pytest.mark.parametrize("path", ADMIN_ONLY_ROUTES)
+@pytest.mark.parametrize("role", ["administrator", "district_officer"])
+def test_administrators_can_read_worker_diagnostics(client_as, path, role):
+    assert client_as(role).get(path).status_code == 200
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockCollection
+from pymongo.errors import BulkWriteError
+
+import server
+
+
+@pytest.fixture(autouse=True)
+def empty_kiosk_queue(monkeypatch):
+    monkeypatch.setattr(server, "kiosk_pending_marks", {})
+
+
+def queue_marks(*student_ids):
+    for student_id in student_ids:
+        server.queue_kiosk_mark(student_id, "school-1", "5", "A", "teacher-1", 0.95)
+
+
+def test_flush_inserts_marks_and_counts_them(mock_db):
+    queue_marks("student-1", "student-2")
+
+    async def scenario():
+        await server.flush_kiosk_marks()
+        return (
+            await mock_db.attendance.count_documents({}),
+            await mock_db.attendance_summaries.find({}, {"_id": 0}).to_list(None),
+        )
+
+    records, summaries = asyncio.run(scenario())
+    assert records == 2
+    assert server.kiosk_pending_marks == {}
+    assert all(summary["totals"] == {"present": 1} and summary["pending"] == 0 for summary in summaries)
+
+
+def test_flush_never_overrides_an_existing_mark(mock_db):
+    queue_marks("student-1")
+
+    async def scenario():
+        await server.mark_students_attendance(
+            server.AttendanceMarkRequest(
+                student_ids=["student-1"], date=next(iter(server.kiosk_pending_marks))[1], status="absent"
+            ),
+            "teacher-1", "school-1"
+        )
+        await server.flush_kiosk_marks()
+        return (
+            await mock_db.attendance.find_one({"student_id": "student-1"}),
+            await mock_db.attendance_summaries.find_one({"student_id": "student-1"}),
+        )
+
+    record, summary = asyncio.run(scenario())
+    assert record["status"] == "absent"
+    assert summary["totals"] == {"absent": 1}
+
+
+def test_partial_bulk_failure_counts_inserts_and_requeues_only_failures(mock_db, monkeypatch):
+    queue_marks("student-1", "student-2", "student-3")
+    bulk_write = AsyncMongoMockCollection.bulk_write
+
+    async def failing_second_operation(self, operations, *args, **kwargs):
+        if self.name != "attendance":
+            return await bulk_write(self, operations, *args, **kwargs)
+        upserted = []
+        for position, operation in enumerate(operations):
+            if position == 1:
+                continue
+            result = await bulk_write(self, [operation], *args, **kwargs)
+            upserted += [{"index": position, "_id": _id} for _id in result.upserted_ids.values()]
+        raise BulkWriteError({
+            "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}],
+            "upserted": upserted, "nUpserted": len(upserted)
+        })
+
+    monkeypatch.setattr(AsyncMongoMockCollection, "bulk_write", failing_second_operation)
+
+    async def scenario():
+        await server.flush_kiosk_marks()
+        return await mock_db.attendance_summaries.find({}, {"_id": 0}).to_list(None)
+
+    summaries = {summary["student_id"]: summary for summary in asyncio.run(scenario())}
+    assert [key[0] for key in server.kiosk_pending_marks] == ["student-2"]
+    assert summaries["student-1"]["totals"] == {"present": 1}
+    assert summaries["student-3"]["totals"] == {"present": 1}
+    assert "totals" not in summaries["student-2"]
+    assert all(summary["pending"] == 0 for summary in summaries.values())
+
+    monkeypatch.setattr(AsyncMongoMockCollection, "bulk_write", bulk_write)
+    asyncio.run(server.flush_kiosk_marks())
+    summary = asyncio.run(mock_db.attendance_summaries.find_one({"student_id": "student-2"}))
+    assert summary["totals"] == {"present": 1}
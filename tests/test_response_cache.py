@@ -0,0 +1,48 @@
+import pytest
+from cachetools import TTLCache
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "response_cache", TTLCache(maxsize=100, ttl=60))
+    app = FastAPI()
+    app.add_middleware(server.CompressionMiddleware)
+
+    @app.get("/report")
+    async def report(request: Request, size: int):
+        async def loader():
+            return {"rows": ["x" * 10] * size}
+        return await server.cached_json_response(request, "school-1", ("attendance",), {"size": size}, loader)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("accept_encoding, size", [
+    ("gzip", 500),
+    ("identity", 500),
+    ("gzip", 1),
+])
+def test_not_modified_carries_the_etag_of_the_full_response(client, accept_encoding, size):
+    headers = {"Accept-Encoding": accept_encoding}
+    full = client.get("/report", params={"size": size}, headers=headers)
+    revalidated = client.get(
+        "/report", params={"size": size}, headers={**headers, "If-None-Match": full.headers["etag"]}
+    )
+
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == full.headers["etag"]
+
+
+def test_compressed_response_uses_a_weak_etag(client):
+    full = client.get("/report", params={"size": 500}, headers={"Accept-Encoding": "gzip"})
+    revalidated = client.get(
+        "/report", params={"size": 500}, headers={"Accept-Encoding": "gzip", "If-None-Match": full.headers["etag"]}
+    )
+
+    assert full.headers["content-encoding"] == "gzip"
+    assert full.headers["etag"].startswith("W/")
+    assert revalidated.headers["vary"] == "Accept-Encoding"
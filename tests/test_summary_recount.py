@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+def mark(student_id, status):
+    request = server.AttendanceMarkRequest(student_ids=[student_id], date="2024-07-15", status=status)
+    return server.mark_students_attendance(request, "teacher-1", "school-1")
+
+
+def test_recount_during_delayed_increment_does_not_double_count(mock_db, monkeypatch):
+    apply_summary_changes = server.apply_summary_changes
+    holding, release = asyncio.Event(), asyncio.Event()
+
+    async def delayed_apply(changes, reservations=None):
+        holding.set()
+        await release.wait()
+        await apply_summary_changes(changes, reservations)
+
+    monkeypatch.setattr(server, "apply_summary_changes", delayed_apply)
+
+    async def scenario():
+        marking = asyncio.create_task(mark("student-1", "present"))
+        await holding.wait()
+        # The record is written but its $inc has not landed yet
+        assert await mock_db.attendance.count_documents({"student_id": "student-1"}) == 1
+        rebuilding = asyncio.create_task(server.rebuild_student_summary("student-1", "school-1"))
+        await asyncio.sleep(0.02)
+        release.set()
+        await marking
+        await rebuilding
+        return await mock_db.attendance_summaries.find_one({"student_id": "student-1"}, {"_id": 0})
+
+    summary = asyncio.run(scenario())
+    assert summary["totals"] == {"present": 1}
+    assert summary["months"] == {"2024-07": {"present": 1}}
+    assert summary["pending"] == 0
+
+
+def test_recount_gives_up_while_writes_stay_in_flight(mock_db, monkeypatch):
+    async def stuck_apply(changes, reservations=None):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(server, "apply_summary_changes", stuck_apply)
+
+    async def scenario():
+        marking = asyncio.create_task(mark("student-1", "present"))
+        await asyncio.sleep(0.01)
+        summary = await server.rebuild_student_summary("student-1", "school-1")
+        marking.cancel()
+        return summary
+
+    summary = asyncio.run(scenario())
+    assert summary["pending"] == 1
+    assert not summary.get("backfilled")
+
+
+def test_recount_matches_incremental_counts(mock_db):
+    async def scenario():
+        await mark("student-1", "present")
+        await mark("student-1", "late")
+        incremental = await mock_db.attendance_summaries.find_one({"student_id": "student-1"}, {"_id": 0})
+        rebuilt = await server.rebuild_student_summary("student-1", "school-1")
+        return incremental, rebuilt
+
+    incremental, rebuilt = asyncio.run(scenario())
+    assert incremental["pending"] == 0
+    assert {k: v for k, v in incremental["totals"].items() if v} == rebuilt["totals"] == {"late": 1}
+    assert rebuilt["backfilled"]
+
+
+def test_failed_mark_releases_its_reservation(mock_db, monkeypatch):
+    async def failing_write(student_id, request, user_id, school_id):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(server, "write_attendance_mark", failing_write)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await mark("student-1", "present")
+        return await mock_db.attendance_summaries.find_one({"student_id": "student-1"}, {"_id": 0})
+
+    assert asyncio.run(scenario())["pending"] == 0
+
+
+def test_stale_reservation_does_not_block_recount(mock_db):
+    async def scenario():
+        await mock_db.attendance_summaries.insert_one({
+            "student_id": "student-1",
+            "school_id": "school-1",
+            "pending": 1,
+            "revision": 3,
+            "updated_at": datetime.now(timezone.utc) - timedelta(seconds=server.SUMMARY_PENDING_TIMEOUT + 1)
+        })
+        return await server.rebuild_student_summary("student-1", "school-1")
+
+    summary = asyncio.run(scenario())
+    assert summary["backfilled"]
+    assert summary["pending"] == 0